@@ -24,11 +24,16 @@ namespace HSR.MotionCapture.Net.Protos {
     static PacketCodeReflection() {
       byte[] descriptorData = global::System.Convert.FromBase64String(
           string.Concat(
-            "ChBwYWNrZXRDb2RlLnByb3RvKogBCgpQYWNrZXRDb2RlEggKBE5PTkUQABIP",
+            "ChBwYWNrZXRDb2RlLnByb3RvKusCCgpQYWNrZXRDb2RlEggKBE5PTkUQABIP",
             "CgtRVUlUX05PVElGWRABEhIKDkhFQVJUX0JFQVRfUkVREAQSEgoOSEVBUlRf",
             "QkVBVF9SU1AQBRINCglGQUNFX0RBVEEQBhINCglQT1NFX0RBVEEQBxINCglI",
-            "QU5EX0RBVEEQCCIECAIQAiIECAMQA0IfqgIcSFNSLk1vdGlvbkNhcHR1cmUu",
-            "TmV0LlByb3Rvc2IGcHJvdG8z"));
+            "QU5EX0RBVEEQCBITCg9GQUNFX1NDSEVNQV9SRVEQCRITCg9GQUNFX1NDSEVN",
+            "QV9SU1AQChIVChFDT01QQUNUX0ZBQ0VfREFUQRALEhAKDEtFWUZSQU1FX1JF",
+            "URAMEhEKDUtFWUZSQU1FX0RBVEEQDRIOCgpERUxUQV9EQVRBEA4SDgoKRlJB",
+            "TUVfREFUQRAPEg4KClRJTUlOR19SRVEQEBIICgRQSU5HEBESCAoEUE9ORxAS",
+            "EhEKDU1VTFRJQ0FTVF9SRVEQExIRCg1NVUxUSUNBU1RfUlNQEBQSEQoNU1VC",
+            "U0NSSUJFX1JFURAVIgQIAhACIgQIAxADQh+qAhxIU1IuTW90aW9uQ2FwdHVy",
+            "ZS5OZXQuUHJvdG9zYgZwcm90bzM="));
       descriptor = pbr::FileDescriptor.FromGeneratedCode(descriptorData,
           new pbr::FileDescriptor[] { },
           new pbr::GeneratedClrTypeInfo(new[] {typeof(global::HSR.MotionCapture.Net.Protos.PacketCode), }, null, null));
@@ -45,6 +50,19 @@ namespace HSR.MotionCapture.Net.Protos {
     [pbr::OriginalName("FACE_DATA")] FaceData = 6,
     [pbr::OriginalName("POSE_DATA")] PoseData = 7,
     [pbr::OriginalName("HAND_DATA")] HandData = 8,
+    [pbr::OriginalName("FACE_SCHEMA_REQ")] FaceSchemaReq = 9,
+    [pbr::OriginalName("FACE_SCHEMA_RSP")] FaceSchemaRsp = 10,
+    [pbr::OriginalName("COMPACT_FACE_DATA")] CompactFaceData = 11,
+    [pbr::OriginalName("KEYFRAME_REQ")] KeyframeReq = 12,
+    [pbr::OriginalName("KEYFRAME_DATA")] KeyframeData = 13,
+    [pbr::OriginalName("DELTA_DATA")] DeltaData = 14,
+    [pbr::OriginalName("FRAME_DATA")] FrameData = 15,
+    [pbr::OriginalName("TIMING_REQ")] TimingReq = 16,
+    [pbr::OriginalName("PING")] Ping = 17,
+    [pbr::OriginalName("PONG")] Pong = 18,
+    [pbr::OriginalName("MULTICAST_REQ")] MulticastReq = 19,
+    [pbr::OriginalName("MULTICAST_RSP")] MulticastRsp = 20,
+    [pbr::OriginalName("SUBSCRIBE_REQ")] SubscribeReq = 21,
   }
 
   #endregion
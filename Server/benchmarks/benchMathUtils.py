@@ -0,0 +1,73 @@
+import os
+import sys
+import timeit
+
+import numpy as np
+
+def _addImportPaths():
+    srcFolder = os.path.join(os.path.dirname(__file__), r'../src')
+    sys.path.insert(1, srcFolder)
+    sys.path.insert(1, os.path.join(srcFolder, r'protos'))
+
+_addImportPaths()
+
+import mathutils
+
+# 旧的实现（faceLandmarker._extractRotation），作为对照。会原地修改 matrix
+def _legacyExtractRotation(matrix) -> tuple:
+    matrix = matrix[:3, :3]
+    matrix /= np.linalg.norm(matrix, axis=0)
+
+    w = np.sqrt(np.maximum(0, 1 + matrix[0, 0] + matrix[1, 1] + matrix[2, 2])) * 0.5
+    x = np.sqrt(np.maximum(0, 1 + matrix[0, 0] - matrix[1, 1] - matrix[2, 2])) * 0.5
+    y = np.sqrt(np.maximum(0, 1 - matrix[0, 0] + matrix[1, 1] - matrix[2, 2])) * 0.5
+    z = np.sqrt(np.maximum(0, 1 - matrix[0, 0] - matrix[1, 1] + matrix[2, 2])) * 0.5
+
+    x = np.copysign(x, matrix[2, 1] - matrix[1, 2])
+    y = np.copysign(y, matrix[0, 2] - matrix[2, 0])
+    z = np.copysign(z, matrix[1, 0] - matrix[0, 1])
+    return w, x, -y, -z
+
+def _randomTransforms(count: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    q = rng.normal(size=(count, 4))
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    w, x, y, z = q.T
+
+    matrices = np.zeros((count, 4, 4), dtype=np.float32)
+    matrices[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    matrices[:, 0, 1] = 2 * (x * y - z * w)
+    matrices[:, 0, 2] = 2 * (x * z + y * w)
+    matrices[:, 1, 0] = 2 * (x * y + z * w)
+    matrices[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    matrices[:, 1, 2] = 2 * (y * z - x * w)
+    matrices[:, 2, 0] = 2 * (x * z - y * w)
+    matrices[:, 2, 1] = 2 * (y * z + x * w)
+    matrices[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    matrices[:, :3, :3] *= rng.uniform(0.5, 2.0, size=(count, 1, 1)).astype(np.float32) # 带上缩放
+    matrices[:, 3, 3] = 1
+    return matrices
+
+def _convertLegacy(matrices: np.ndarray) -> np.ndarray:
+    return np.array([_legacyExtractRotation(m.copy()) for m in matrices])
+
+def _convertVectorized(matrices: np.ndarray) -> np.ndarray:
+    return mathutils.toUnityQuaternions(mathutils.matrixToQuaternions(matrices))
+
+def main():
+    for count in (1, 4, 64, 1024):
+        matrices = _randomTransforms(count)
+        original = matrices.copy()
+
+        assert np.allclose(_convertLegacy(matrices), _convertVectorized(matrices), atol=1e-4)
+        assert np.array_equal(matrices, original), 'input was modified'
+
+        number = max(1, 20000 // count)
+        legacySecs = min(timeit.repeat(lambda: _convertLegacy(matrices), number=number, repeat=5)) / number
+        vectorizedSecs = min(timeit.repeat(lambda: _convertVectorized(matrices), number=number, repeat=5)) / number
+
+        print(f'{count:>5} matrices: legacy {legacySecs * 1e6:>10.1f} us, '
+              f'vectorized {vectorizedSecs * 1e6:>8.1f} us, speedup {legacySecs / vectorizedSecs:>6.1f}x')
+
+if __name__ == '__main__':
+    main()
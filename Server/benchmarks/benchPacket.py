@@ -0,0 +1,74 @@
+import os
+import sys
+import timeit
+
+def _addImportPaths():
+    srcFolder = os.path.join(os.path.dirname(__file__), r'../src')
+    sys.path.insert(1, srcFolder)
+    sys.path.insert(1, os.path.join(srcFolder, r'protos'))
+
+_addImportPaths()
+
+from packet import Packet, PacketWriter, PACKET_CONST_HEAD, PACKET_CONST_TAIL
+from protos.packetCode_pb2 import PacketCode
+
+# 旧的实现，作为对照
+def _legacyReadUInt16(data: bytes, startIndex: int) -> int:
+    return (data[startIndex] << 8) | data[startIndex + 1]
+
+def _legacyWriteUInt16(buffer: bytearray, value: int) -> None:
+    buffer.append((value >> 8) & 0xFF)
+    buffer.append(value & 0xFF)
+
+def _legacyEncode(packet: Packet) -> bytearray:
+    buffer = bytearray()
+    _legacyWriteUInt16(buffer, PACKET_CONST_HEAD)
+    _legacyWriteUInt16(buffer, packet.packetCode)
+
+    if packet.payloadBytes is None:
+        _legacyWriteUInt16(buffer, 0)
+    else:
+        _legacyWriteUInt16(buffer, len(packet.payloadBytes))
+        buffer.extend(packet.payloadBytes)
+
+    _legacyWriteUInt16(buffer, PACKET_CONST_TAIL)
+    return buffer
+
+def _legacyDecode(data: bytes):
+    if len(data) < 8:
+        return None
+    if _legacyReadUInt16(data, 0) != PACKET_CONST_HEAD:
+        return None
+    payloadLength = _legacyReadUInt16(data, 4)
+    if len(data) != 8 + payloadLength:
+        return None
+    if _legacyReadUInt16(data, 6 + payloadLength) != PACKET_CONST_TAIL:
+        return None
+    return Packet(_legacyReadUInt16(data, 2), data[6:6+payloadLength])
+
+def _report(name: str, func, number: int, payloadSize: int):
+    secs = min(timeit.repeat(func, number=number, repeat=7))
+    opsPerSec = number / secs
+    print(f'{name:<28}{opsPerSec / 1e6:>8.3f} Mops/s{opsPerSec * payloadSize / 2**20:>12.1f} MiB/s')
+
+def main():
+    number = 200000
+
+    for payloadSize in (0, 128, 1200):
+        packet = Packet(PacketCode.FACE_DATA, os.urandom(payloadSize))
+        data = bytes(packet.encode())
+        writer = PacketWriter()
+
+        assert _legacyEncode(packet) == data
+        assert bytes(writer.write(packet)) == data
+        assert bytes(Packet.decode(data).payloadBytes) == bytes(_legacyDecode(data).payloadBytes)
+
+        print(f'--- payload {payloadSize} bytes ---')
+        _report('encode (before)', lambda: _legacyEncode(packet), number, payloadSize)
+        _report('encode (after)', packet.encode, number, payloadSize)
+        _report('PacketWriter.write (after)', lambda: writer.write(packet), number, payloadSize)
+        _report('decode (before)', lambda: _legacyDecode(data), number, payloadSize)
+        _report('decode (after)', lambda: Packet.decode(data), number, payloadSize)
+
+if __name__ == '__main__':
+    main()
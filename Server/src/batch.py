@@ -0,0 +1,134 @@
+import os
+import sys
+
+def _addProtoImportPath():
+    srcFolder = os.path.dirname(__file__)
+    protosFolder = os.path.join(srcFolder, r'protos')
+
+    if protosFolder not in sys.path:
+        sys.path.insert(1, protosFolder)
+
+class _PacketCollector(object):
+    # 代替 UDPServer 传给 Landmarker，把数据包收集起来
+    def __init__(self, packetCodes: frozenset):
+        self._packetCodes = packetCodes
+        self.timestampMS = 0
+        self.recording = True
+        self.records = []
+
+    def hasSubscribers(self, packetCode) -> bool:
+        return self.recording and packetCode in self._packetCodes
+
+    def send(self, packet, *, clientAddr=...):
+        if self.hasSubscribers(packet.packetCode):
+            self.records.append((self.timestampMS, packet.packetCode, bytes(packet.payloadBytes or b'')))
+
+def _processChunk(videoPath: str, fps: float, startFrame: int, endFrame: int, warmUpFrames: int, packetCodes: frozenset) -> list:
+    #! 在工作进程执行
+    _addProtoImportPath()
+
+    import cv2
+    import mediapipe as mp
+    import config
+
+    collector = _PacketCollector(packetCodes)
+    landmarker = config.getLandmarker(collector, running_mode=mp.tasks.vision.RunningMode.VIDEO)
+
+    firstFrame = max(0, startFrame - warmUpFrames)
+    cap = cv2.VideoCapture(videoPath)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, firstFrame)
+
+    # 解码和颜色转换都复用同一块内存。VIDEO 模式下 detect 返回时已经处理完了这一帧
+    img = None
+    rgb = None
+
+    try:
+        for frameIndex in range(firstFrame, endFrame):
+            success, img = cap.read(img)
+            if not success:
+                break
+
+            # 前面多处理的帧只用来让跟踪稳定下来，结果丢掉
+            collector.recording = frameIndex >= startFrame
+            collector.timestampMS = int(frameIndex * 1000 / fps)
+
+            rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=rgb)
+            landmarker.detect(rgb, collector.timestampMS)
+    finally:
+        cap.release()
+        landmarker.close()
+
+    return collector.records
+
+def _splitChunks(frameCount: int, chunkFrames: int) -> list:
+    # 拿不到总帧数时只能整个视频一起处理
+    if frameCount <= 0:
+        return [(0, sys.maxsize)]
+    return [(start, min(start + chunkFrames, frameCount)) for start in range(0, frameCount, chunkFrames)]
+
+def main():
+    _addProtoImportPath()
+
+    import argparse
+    import time
+    import cv2
+    import config
+
+    from concurrent.futures import ProcessPoolExecutor
+    from motionFile import MotionFileWriter
+    from packet import Packet
+    from protos.packetCode_pb2 import PacketCode
+
+    parser = argparse.ArgumentParser(description='Process video files offline and save the motion data.')
+    parser.add_argument('video', help='the video file to process')
+    parser.add_argument('-o', '--output', help='the output motion file, defaults to <video>.motion')
+    parser.add_argument('-w', '--workers', type=int, default=config.BATCH_CONFIG['workers'])
+    parser.add_argument('--chunk-secs', type=float, default=config.BATCH_CONFIG['chunkSecs'])
+    parser.add_argument('--overlap-secs', type=float, default=config.BATCH_CONFIG['overlapSecs'])
+    parser.add_argument('--packets', nargs='+', default=['COMPACT_FACE_DATA', 'POSE_DATA', 'HAND_DATA', 'FRAME_DATA'],
+                        choices=PacketCode.keys(), help='the packet codes to save')
+    args = parser.parse_args()
+
+    videoPath = os.path.abspath(args.video)
+    outputPath = args.output or (os.path.splitext(videoPath)[0] + '.motion')
+    packetCodes = frozenset(PacketCode.Value(name) for name in args.packets)
+
+    cap = cv2.VideoCapture(videoPath)
+    if not cap.isOpened():
+        print(f'Failed to open \'{videoPath}\'!')
+        exit(-1)
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frameCount = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    chunks = _splitChunks(frameCount, max(1, round(args.chunk_secs * fps)))
+    warmUpFrames = max(0, round(args.overlap_secs * fps))
+    print(f'Processing \'{videoPath}\' ({frameCount} frames, {fps:.2f} fps) in {len(chunks)} chunks...')
+
+    startTime = time.perf_counter()
+
+    with ProcessPoolExecutor(args.workers) as pool, MotionFileWriter(outputPath) as writer:
+        if PacketCode.COMPACT_FACE_DATA in packetCodes:
+            from landmarkers.faceLandmarker import createFaceSchemaPacket
+            writer.write(0, createFaceSchemaPacket())
+
+        futures = [
+            pool.submit(_processChunk, videoPath, fps, start, end, warmUpFrames, packetCodes)
+            for start, end in chunks
+        ]
+
+        # 按顺序写入，保证文件里的时间戳是递增的
+        for i, future in enumerate(futures):
+            for timestampMS, packetCode, payloadBytes in future.result():
+                writer.write(timestampMS, Packet(packetCode, payloadBytes))
+            print(f'Chunk {i + 1}/{len(chunks)} finished.')
+
+        recordCount = writer.recordCount
+
+    elapsedSecs = time.perf_counter() - startTime
+    videoSecs = frameCount / fps
+    print(f'Saved {recordCount} packets to \'{outputPath}\' in {elapsedSecs:.1f}s ({videoSecs / elapsedSecs:.1f}x real time).')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+import numpy as np
+
+from packet import Packet
+from protos.channelFrame_pb2 import ChannelFrame
+from protos.packetCode_pb2 import PacketCode
+
+_SEQUENCE_MASK = 0xFFFFFFFF
+
+# stream -> [ChannelStreamEncoder]，处理 KEYFRAME_REQ 时用
+_encoders = {}
+
+def addKeyframeSource(stream: PacketCode, source):
+    # source 需要有 requestKeyframe 方法。中继服务器用它把 KEYFRAME_REQ 转发给上游
+    _encoders.setdefault(stream, []).append(source)
+
+def removeKeyframeSource(stream: PacketCode, source):
+    # 不再使用的 encoder 要移除，否则会一直留在这里
+    sources = _encoders.get(stream, None)
+
+    if sources is not None and source in sources:
+        sources.remove(source)
+
+def requestKeyframe(stream: PacketCode) -> bool:
+    encoders = _encoders.get(stream, None)
+
+    if not encoders:
+        return False
+
+    for encoder in encoders:
+        encoder.requestKeyframe()
+    return True
+
+class ChannelStreamEncoder(object):
+    # 把每帧固定数量的通道值编码成关键帧和增量帧
+    # 增量帧只带上和接收方现有的值相差超过 epsilon 的通道
+    def __init__(self, stream: PacketCode, channelCount: int, *, epsilon=1e-3, keyframeInterval=60, sourceId=0):
+        self._stream = stream
+        self._sourceId = sourceId
+        self._epsilon = np.asarray(epsilon, dtype=np.float32)
+        self._keyframeInterval = keyframeInterval
+
+        # 接收方现在持有的值
+        self._values = np.zeros(channelCount, dtype=np.float32)
+        self._sequence = 0
+        self._framesSinceKeyframe = 0
+        self._keyframeRequested = True
+
+        addKeyframeSource(stream, self)
+
+    @property
+    def stream(self) -> PacketCode:
+        return self._stream
+
+    def close(self):
+        removeKeyframeSource(self._stream, self)
+
+    def requestKeyframe(self):
+        #! 在接收线程调用
+        self._keyframeRequested = True
+
+    def reset(self):
+        self._keyframeRequested = True
+
+    def encode(self, values: np.ndarray, subjectId: int = 0) -> Packet | None:
+        # 没有通道发生变化时返回 None，不需要发送
+        # 同时跟踪多个对象时每个对象用一个 encoder，对象换了要先 reset
+        values = np.asarray(values, dtype=np.float32)
+
+        frame = ChannelFrame()
+        frame.stream = self._stream
+        frame.subjectId = subjectId
+        frame.sourceId = self._sourceId
+
+        # 即使通道都没有变化，也定期发关键帧，让丢过包的接收方能恢复
+        self._framesSinceKeyframe += 1
+
+        if self._keyframeRequested or self._framesSinceKeyframe >= self._keyframeInterval:
+            self._keyframeRequested = False
+            self._framesSinceKeyframe = 0
+            self._values[:] = values
+
+            frame.sequence = self._nextSequence()
+            frame.channelValues = self._values.astype('<f4', copy=False).tobytes()
+            return Packet(PacketCode.KEYFRAME_DATA, frame.SerializeToString(), subjectId=subjectId, sourceId=self._sourceId)
+
+        changed = np.flatnonzero(np.abs(values - self._values) > self._epsilon)
+
+        if len(changed) == 0:
+            return None
+
+        self._values[changed] = values[changed]
+
+        frame.sequence = self._nextSequence()
+        frame.channelIndices = changed.astype('<u2').tobytes()
+        frame.channelValues = self._values[changed].astype('<f4', copy=False).tobytes()
+        return Packet(PacketCode.DELTA_DATA, frame.SerializeToString(), subjectId=subjectId, sourceId=self._sourceId)
+
+    def _nextSequence(self) -> int:
+        self._sequence = (self._sequence + 1) & _SEQUENCE_MASK
+        return self._sequence
+
+class ChannelStreamDecoder(object):
+    # 接收方的实现，还原出每帧的完整通道值
+    # 同一个数据流里交替着多个采集源、多个对象的帧，它们的序号是独立的，按 (sourceId, subjectId) 分开保存状态
+    def __init__(self, channelCount: int):
+        self._channelCount = channelCount
+
+        # (sourceId, subjectId) -> [values, sequence]
+        self._subjects = {}
+
+    @property
+    def subjects(self) -> list[tuple[int, int]]:
+        return list(self._subjects.keys())
+
+    @property
+    def isSynchronized(self) -> bool:
+        # 收到过的所有对象都没有丢帧
+        return len(self._subjects) > 0 and all(s[1] is not None for s in self._subjects.values())
+
+    def forget(self, sourceId: int, subjectId: int):
+        # 对象消失以后调用，释放它的状态
+        self._subjects.pop((sourceId, subjectId), None)
+
+    def decode(self, packet: Packet) -> tuple[tuple[int, int], np.ndarray, bool]:
+        # 返回 ((sourceId, subjectId), values, needKeyframe)。needKeyframe 为 True 时应该发送 KEYFRAME_REQ
+        frame = ChannelFrame.FromString(bytes(packet.payloadBytes))
+        channelValues = np.frombuffer(frame.channelValues, dtype='<f4')
+
+        key = (frame.sourceId, frame.subjectId)
+        state = self._subjects.get(key, None)
+
+        if state is None:
+            state = [np.zeros(self._channelCount, dtype=np.float32), None]
+            self._subjects[key] = state
+
+        values = state[0]
+
+        if packet.packetCode == PacketCode.KEYFRAME_DATA:
+            values[:] = channelValues
+            state[1] = frame.sequence
+            return key, values.copy(), False
+
+        channelIndices = np.frombuffer(frame.channelIndices, dtype='<u2')
+        values[channelIndices] = channelValues
+
+        # 丢包了，在收到关键帧之前数据都不可靠
+        if state[1] is None or frame.sequence != ((state[1] + 1) & _SEQUENCE_MASK):
+            state[1] = None
+            return key, values.copy(), True
+
+        state[1] = frame.sequence
+        return key, values.copy(), False
@@ -14,13 +14,105 @@ SERVER_CONFIG = {
 
     # 接收消息的缓冲区的大小
     'recvBufferSize': 2048,
+
+    # 接收线程等待数据的超时秒数
+    # 只影响关闭服务器时的响应速度，没有数据时接收线程不会占用 CPU
+    'recvPollTimeoutSecs': 0.1,
+
+    # 发送消息的缓冲区的初始大小，数据包更大时会自动扩容
+    'sendBufferSize': 2048,
+
+    # 在 Linux 上用一次 sendmmsg 系统调用把数据包发给所有客户端
+    # 其他平台会自动退回到逐个 sendto
+    'useSendMMsg': True,
+
+    # 给发送过 TIMING_REQ 的客户端发送 PING 的间隔秒数，用来计算往返时间和丢包率
+    'pingIntervalSecs': 1.0,
+
+    # 超过这个时间没有收到 PONG 就算丢包
+    'pingTimeoutSecs': 2.0,
+
+    # 组播地址，例如 '239.255.42.99'，None 表示不启用组播
+    # 客户端发送 MULTICAST_REQ 加入组播以后，FACE_DATA 等数据包只往组播地址发送一次，心跳等控制包仍然走单播
+    'multicastGroup': None,
+
+    # 组播端口
+    'multicastPort': 5003,
+
+    # 组播包的 TTL，1 表示不离开局域网
+    'multicastTTL': 1,
+
+    # 发送组播的网卡地址，None 表示由系统选择。只在本机测试时可以用 '127.0.0.1'
+    'multicastInterface': None,
 }
 
 # 捕获设置
 CAPTURE_CONFIG = {
     # 摄像头设备索引，或者视频文件的名称
     # 参考 OpenCV 的 VideoCapture
+    # 也可以是一个列表，同时处理多个采集源，例如 [0, 1]。每个源在单独的工作进程里采集和推理，见 SOURCE_WORKER_CONFIG
+    # 列表里的元素也可以是 dict，覆盖下面的设置，例如 { 'cameraIndexOrVideoFileName': 1, 'width': 640, 'height': 480 }
     'cameraIndexOrVideoFileName': 0,
+
+    # 摄像头的像素格式、分辨率和帧率，None 表示使用默认值
+    # 很多 USB 摄像头只有在 MJPG 格式下才能以高分辨率跑满帧率
+    'fourcc': 'MJPG',
+    'width': 1280,
+    'height': 720,
+    'fps': 30.0,
+
+    # 驱动里缓存的帧数，越小延迟越低。不是所有后端都支持
+    'driverBufferSize': 1,
+
+    # 循环使用的 RGB 图像缓冲区数量，避免每帧都分配内存
+    # 不能小于 PIPELINE_CONFIG 里两个队列的长度之和 + 3（正在解码、推理和显示的帧各一个），否则 FramePipeline 会报错
+    'bufferCount': 5,
+}
+
+# 多个采集源的设置
+# 数据包里的 sourceId 是采集源在 CAPTURE_CONFIG['cameraIndexOrVideoFileName'] 里的下标
+SOURCE_WORKER_CONFIG = {
+    # 工作进程发给主进程、还没有发送的数据包的最大数量，主进程来不及发送时丢掉新的数据包
+    'packetQueueSize': 256,
+
+    # 主进程等待数据包的超时秒数，只影响关闭时的响应速度
+    'pollTimeoutSecs': 0.1,
+}
+
+# 帧流水线设置
+PIPELINE_CONFIG = {
+    # 采集到推理之间的队列长度
+    # 推理跟不上时丢掉旧帧，而不是排队等待
+    'captureQueueSize': 1,
+
+    # 推理到显示之间的队列长度
+    'displayQueueSize': 1,
+
+    # 子线程等待新帧的超时秒数
+    'pollTimeoutSecs': 0.1,
+}
+
+# 自适应调节设置
+# 根据推理耗时调整送去推理的帧率和分辨率，性能较差的机器上延迟不会越积越多
+GOVERNOR_CONFIG = {
+    # 是否启用
+    'enable': True,
+
+    # 目标输出帧率
+    'targetFps': 30.0,
+
+    # 推理输入相对于采集分辨率的最小和最大缩放
+    'minScale': 0.5,
+    'maxScale': 1.0,
+
+    # 每次调整缩放的步长
+    'scaleStep': 0.1,
+
+    # 推理耗时的平滑系数，越小越平滑
+    'latencySmoothing': 0.2,
+
+    # 调整分辨率的间隔秒数
+    'adjustIntervalSecs': 1.0,
 }
 
 # 视频窗口设置
@@ -35,11 +127,197 @@ WINDOW_CONFIG = {
     'enable': True,
 }
 
+# Landmarker 组设置
+LANDMARKER_GROUP_CONFIG = {
+    # 是否在线程池里同时运行多个 Landmarker（例如同时开启 Face 和 Pose）
+    'concurrent': True,
+
+    # 是否把每帧所有 Landmarker 的数据包合并成一个 FRAME_DATA 发送
+    # 客户端需要支持 FRAME_DATA
+    'combinePackets': False,
+}
+
+# 多人设置
+SUBJECT_CONFIG = {
+    # 每帧最多检测的脸、人和手的数量。脸多于一张时不使用 ROI_TRACKING_CONFIG
+    'maxFaces': 1,
+    'maxPoses': 1,
+    'maxHands': 2,
+
+    # 给每个对象分配稳定的 ID，数据包里的 subjectId 就是这个 ID
+    'tracking': {
+        # 和上一帧的包围盒的 IoU 超过这个值就认为是同一个对象
+        'minIoU': 0.3,
+
+        # IoU 不够时，包围盒中心的距离（归一化坐标）小于这个值也认为是同一个对象
+        'maxCentroidDistance': 0.1,
+
+        # 连续这么多帧没有检测到，就释放这个对象的 ID
+        'maxMissedFrames': 5,
+    },
+}
+
+# 时域滤波设置
+# 在服务器上平滑数据，客户端就不需要再缓冲几帧做平滑了
+FILTER_CONFIG = {
+    # BlendShape 的滤波
+    'blendShapes': {
+        # 'oneEuro'、'kalman' 或者 None（不滤波）
+        'type': None,
+
+        # One Euro Filter 的默认参数
+        # minCutoff 越小越平滑，beta 越大快速运动时的延迟越小
+        'oneEuro': {
+            'minCutoff': 1.0,
+            'beta': 5.0,
+            'dCutoff': 1.0,
+        },
+
+        # 匀速模型卡尔曼滤波的默认参数
+        'kalman': {
+            'processNoise': 10.0,
+            'measurementNoise': 1e-3,
+        },
+
+        # 按 BlendShape 名称单独调整参数，只会用到当前滤波器认识的参数
+        'channels': {
+            # 眨眼很快，少平滑一些
+            'eyeBlinkLeft': { 'minCutoff': 4.0 },
+            'eyeBlinkRight': { 'minCutoff': 4.0 },
+        },
+    },
+
+    # 头部旋转的滤波
+    'headRotation': {
+        # 'slerp' 或者 None（不滤波）
+        'type': None,
+
+        'slerp': {
+            'minCutoff': 1.0,
+            'beta': 0.5,
+            'dCutoff': 1.0,
+        },
+    },
+}
+
+# 人脸区域跟踪设置
+# 根据上一帧的结果只把脸附近的区域送去推理，跟丢以后退回到整帧
+ROI_TRACKING_CONFIG = {
+    # 是否启用
+    'enable': True,
+
+    # 在人脸框的每一边额外留出的比例
+    'padding': 0.5,
+
+    # 裁剪区域的最小边长（像素）
+    'minSize': 160,
+
+    # 连续多少帧没有检测到人脸后退回到整帧
+    'maxMissedFrames': 2,
+
+    # 人脸移动或者缩放超过裁剪区域大小的这个比例时，才移动裁剪区域
+    # 裁剪区域改变时 mediapipe 内部的跟踪会丢掉一帧
+    'moveThreshold': 0.1,
+    'resizeThreshold': 0.15,
+}
+
+# 增量数据流设置
+# 客户端发送 KEYFRAME_REQ 后改为接收关键帧 + 增量帧
+DELTA_STREAM_CONFIG = {
+    # 通道值的变化超过这个值才会发送
+    'epsilon': 2e-3,
+
+    # 每隔多少帧发送一次关键帧
+    'keyframeInterval': 60,
+}
+
+# 性能统计设置
+METRICS_CONFIG = {
+    # 是否启用。关闭后各阶段耗时、流量和图像复制都不再记录，也不打印、不提供 HTTP 接口
+    'enable': True,
+
+    # 每隔多少秒打印一次各阶段耗时的百分位数和每个客户端的流量，None 表示不打印
+    'logIntervalSecs': 10.0,
+
+    # 在 http://127.0.0.1:<httpPort>/metrics 提供 JSON 格式的数据，None 表示不启用
+    'httpPort': 5001,
+}
+
+# 录制设置
+# 把广播的数据包记录到文件里，之后可以用 playback.py 重放
+RECORD_CONFIG = {
+    # 是否启用录制
+    'enable': False,
+
+    # 录制文件保存的文件夹，文件名是开始录制的时间
+    'folder': _src(r'../records'),
+
+    # 每个块的大小（字节），块越大索引越小，但是定位到时间点后要在块内多扫描一些记录
+    'chunkSize': 64 * 1024,
+}
+
+# 中继设置（relay.py）
+# 中继服务器作为普通客户端连接上游，再把数据广播给自己的客户端。中继可以串联，上游也可以是另一个中继
+RELAY_CONFIG = {
+    # 上游服务器的地址
+    'upstreamHost': '127.0.0.1',
+    'upstreamPort': 5000,
+
+    # 中继服务器自己的端口号
+    'port': 5002,
+
+    # 向上游发送心跳的间隔秒数，要比上游的 heartBeatTimeoutSecs 小
+    'heartBeatIntervalSecs': 2.0,
+
+    # 超过这个时间没有收到上游的数据就认为断开了，之后会一直尝试重新连接
+    'timeoutSecs': 5.0,
+}
+
+# 离线批处理设置（batch.py）
+BATCH_CONFIG = {
+    # 工作进程数量，None 表示和 CPU 核心数相同
+    'workers': None,
+
+    # 每个工作进程一次处理的视频长度（秒）
+    'chunkSecs': 30.0,
+
+    # 每段视频往前多处理的长度（秒），让跟踪和滤波先稳定下来，这部分结果会被丢掉
+    'overlapSecs': 2.0,
+}
+
+# 每个采集源的 LazyLiveCapture 参数
+def getCaptureConfigs() -> list[dict]:
+    sources = CAPTURE_CONFIG['cameraIndexOrVideoFileName']
+
+    if not isinstance(sources, (list, tuple)):
+        return [CAPTURE_CONFIG]
+
+    results = []
+    for source in sources:
+        if not isinstance(source, dict):
+            source = { 'cameraIndexOrVideoFileName': source }
+        results.append({ **CAPTURE_CONFIG, **source })
+    return results
+
 # 用到的 Landmarker
-def getLandmarker(server):
+# kwargs 会传给每个 Landmarker，例如离线处理时的 running_mode
+def getLandmarker(server, **kwargs):
+    import filters as fs
     import landmarkers as ls
 
+    maxFaces = SUBJECT_CONFIG['maxFaces']
+    tracking = SUBJECT_CONFIG['tracking']
+
     return ls.LandmarkerGroup(
-        ls.FaceLandmarker(server, model_asset_path=_src(r'../models/face_landmarker.task')),
-        # ls.PoseLandmarker(server, model_asset_path=_src(r'../models/pose_landmarker_heavy.task')),
+        ls.FaceLandmarker(server, model_asset_path=_src(r'../models/face_landmarker.task'), num_faces=maxFaces,
+                          blend_shape_filter=fs.createChannelFilter(ls.BLEND_SHAPE_NAMES, slotCount=maxFaces, **FILTER_CONFIG['blendShapes']),
+                          head_rotation_filter=fs.createQuaternionFilter(slotCount=maxFaces, **FILTER_CONFIG['headRotation']),
+                          delta_stream_options=DELTA_STREAM_CONFIG,
+                          roi_tracker=ls.createRoiTracker(**ROI_TRACKING_CONFIG),
+                          subject_tracking_options=tracking, **kwargs),
+        # ls.PoseLandmarker(server, model_asset_path=_src(r'../models/pose_landmarker_heavy.task'),
+        #                   num_poses=SUBJECT_CONFIG['maxPoses'], subject_tracking_options=tracking, **kwargs),
+        # ls.HandLandmarker(server, model_asset_path=_src(r'../models/hand_landmarker.task'),
+        #                   num_hands=SUBJECT_CONFIG['maxHands'], subject_tracking_options=tracking, **kwargs),
+        **LANDMARKER_GROUP_CONFIG,
     )
@@ -1,15 +1,163 @@
 import cv2
 import functools
+import threading
+import time
+import typing
+
+import numpy as np
+
+from metrics import metrics
+
+class FrameCopyStats(object):
+    # 统计从采集到推理每帧复制了几次图像、复制了多少字节。metrics 关闭时不统计
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._lock.acquire()
+        try:
+            self._frameCount = 0
+            self._copyCount = 0
+            self._byteCount = 0
+        finally:
+            self._lock.release()
+
+    def addFrame(self):
+        if not metrics.enabled:
+            return
+
+        self._lock.acquire()
+        try:
+            self._frameCount += 1
+        finally:
+            self._lock.release()
+
+    def addCopy(self, nbytes: int):
+        if not metrics.enabled:
+            return
+
+        self._lock.acquire()
+        try:
+            self._copyCount += 1
+            self._byteCount += nbytes
+        finally:
+            self._lock.release()
+
+    @property
+    def copiesPerFrame(self) -> float:
+        return self._copyCount / max(1, self._frameCount)
+
+    @property
+    def bytesPerFrame(self) -> float:
+        return self._byteCount / max(1, self._frameCount)
+
+    def __str__(self):
+        return f'{self._frameCount} frames, {self.copiesPerFrame:.2f} copies/frame, {self.bytesPerFrame / 1024:.0f} KiB/frame'
+
+frameCopyStats = FrameCopyStats()
 
 class LazyLiveCapture(object):
-    def __init__(self, cameraIndexOrVideoFileName: int | str):
+    # read 返回 RGB 格式的图像
+    # 图像来自预先分配好的 bufferCount 个缓冲区，循环使用。
+    # 缓冲区的数量不能小于同时在使用的帧的数量（队列里的帧 + 正在解码、推理和显示的帧各一个），否则图像会被覆盖
+    def __init__(self, cameraIndexOrVideoFileName: int | str, bufferCount: int = 5, *,
+                 fourcc: str | None = None, width: int | None = None, height: int | None = None, fps: float | None = None,
+                 driverBufferSize: int | None = 1):
         self._createCap = functools.partial(cv2.VideoCapture, cameraIndexOrVideoFileName)
         self._cap = None
+        self._isFile = isinstance(cameraIndexOrVideoFileName, str)
+        self._sourceFps = 0.0
 
-    def read(self):
+        self._fourcc = fourcc
+        self._width = width
+        self._height = height
+        self._fps = fps
+        self._driverBufferSize = driverBufferSize
+
+        self._bgrBuffer = None
+        self._rgbBuffers = [None] * max(1, bufferCount)
+        self._nextBufferIndex = 0
+        self._timestamp = 0.0
+
+    @property
+    def bufferCount(self) -> int:
+        return len(self._rgbBuffers)
+
+    @property
+    def isFile(self) -> bool:
+        # 视频文件不会丢帧，读多快就走多快
+        return self._isFile
+
+    @property
+    def sourceFps(self) -> float:
+        # 打开以后实际的帧率，拿不到时为 0
+        return self._sourceFps
+
+    @property
+    def timestamp(self) -> float:
+        # 最近一次 grab 的时间，time.monotonic()
+        return self._timestamp
+
+    def _open(self):
+        cap = self._createCap()
+
+        # 有些后端要求先设置 FOURCC 再设置分辨率
+        if self._fourcc is not None:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self._fourcc))
+        if self._width is not None:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self._width)
+        if self._height is not None:
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self._height)
+        if self._fps is not None:
+            cap.set(cv2.CAP_PROP_FPS, self._fps)
+
+        # 驱动里缓存的帧越多，拿到的帧就越旧。不是所有后端都支持
+        if self._driverBufferSize is not None:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, self._driverBufferSize)
+
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self._sourceFps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        print(f'Capture: {width}x{height} @ {self._sourceFps:.1f} fps')
+        return cap
+
+    def grab(self) -> bool:
+        # 只取帧，不解码。解码用 retrieve
         if self._cap is None:
-            self._cap = self._createCap()
-        return self._cap.read()
+            self._cap = self._open()
+
+        success = self._cap.grab()
+        self._timestamp = time.monotonic()
+        return success
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def retrieve(self):
+        # 尺寸不变时直接解码到原来的缓冲区里
+        success, bgr = self._cap.retrieve(self._bgrBuffer)
+
+        if not success:
+            return False, None
+
+        self._bgrBuffer = bgr
+
+        index = self._nextBufferIndex
+        self._nextBufferIndex = (index + 1) % len(self._rgbBuffers)
+
+        rgb = self._rgbBuffers[index]
+        if rgb is None or rgb.shape != bgr.shape:
+            rgb = np.empty_like(bgr)
+            self._rgbBuffers[index] = rgb
+
+        cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=rgb)
+
+        frameCopyStats.addFrame()
+        frameCopyStats.addCopy(rgb.nbytes)
+        return True, rgb
 
     def release(self):
         if self._cap is None:
@@ -17,14 +165,20 @@ class LazyLiveCapture(object):
         self._cap.release()
         self._cap = None
 
+        if metrics.enabled:
+            print(f'Capture: {frameCopyStats}')
+        frameCopyStats.reset()
+
 class LazyLiveWindow(object):
     def __init__(self, name: str, topmost: bool, enable: bool):
         self._name = name
         self._topmost = topmost
         self._enable = enable
         self._hasWindow = False
+        self._bgrBuffer = None
 
-    def showImage(self, img):
+    def showImage(self, img, draw: typing.Callable[[np.ndarray], None] | None = None):
+        # img 是 RGB 格式的图像，不会被修改。draw 在转换成 BGR 之后的图像上绘制
         if not self._enable:
             return
 
@@ -34,7 +188,15 @@ class LazyLiveWindow(object):
                 cv2.setWindowProperty(self._name, cv2.WND_PROP_TOPMOST, 1)
             self._hasWindow = True
 
-        cv2.imshow(self._name, img)
+        if self._bgrBuffer is None or self._bgrBuffer.shape != img.shape:
+            self._bgrBuffer = np.empty_like(img)
+
+        cv2.cvtColor(img, cv2.COLOR_RGB2BGR, dst=self._bgrBuffer)
+
+        if draw is not None:
+            draw(self._bgrBuffer)
+
+        cv2.imshow(self._name, self._bgrBuffer)
 
     def close(self):
         if not self._enable:
@@ -0,0 +1,292 @@
+import math
+import numpy as np
+import typing
+
+def _smoothingFactor(cutoff, dt: float):
+    # 一阶低通滤波器的系数
+    tau = 1.0 / (2 * math.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+def _prepareSlots(values: np.ndarray, slots) -> tuple[np.ndarray, np.ndarray, bool]:
+    # values 的形状是 (channelCount,) 或者 (n, channelCount)。返回 (二维的 values, 槽位, 是否是一维的输入)
+    # 一维的输入使用 0 号槽位
+    single = values.ndim == 1
+
+    if single:
+        values = values[np.newaxis]
+
+    if slots is None:
+        slots = np.arange(len(values))
+    return values, np.asarray(slots, dtype=np.intp).reshape(-1), single
+
+def _classifyTimestamps(lastTimestampMS: np.ndarray, timestampMS: int, maxGapSecs: float):
+    # 返回 (dt, 正常更新的, 时间戳没有变化的, 需要重新开始的)
+    # 没有上一帧（nan）或者中断太久时用测量值重新开始
+    dt = (timestampMS - lastTimestampMS) / 1000
+    step = (dt > 0) & (dt <= maxGapSecs)
+    stale = dt <= 0
+    return dt, step, stale, ~(step | stale)
+
+class ChannelFilter(object):
+    # 对固定数量的通道逐帧滤波。所有参数都可以是标量，也可以是每个通道一个值的数组
+    # 可以同时给 slotCount 个对象（例如多张脸）滤波，每个槽位的状态互相独立，一次计算完
+    PARAMS = ()
+
+    def __init__(self, channelCount: int, *, slotCount=1, maxGapSecs=0.5, **params):
+        self._channelCount = channelCount
+        self._slotCount = slotCount
+        self._maxGapSecs = maxGapSecs
+        self._lastTimestampMS = np.full(slotCount, np.nan, dtype=np.float64)
+
+        for name in self.PARAMS:
+            value = params.pop(name)
+            setattr(self, '_' + name, np.full(channelCount, value, dtype=np.float64))
+
+        if len(params) > 0:
+            raise TypeError(f'Unknown filter params: {", ".join(params.keys())}')
+
+    @property
+    def channelCount(self) -> int:
+        return self._channelCount
+
+    @property
+    def slotCount(self) -> int:
+        return self._slotCount
+
+    def setChannelParams(self, channel: int, **params):
+        for name, value in params.items():
+            if name not in self.PARAMS:
+                raise TypeError(f'Unknown filter param: {name}')
+            getattr(self, '_' + name)[channel] = value
+
+    def reset(self, slots=None):
+        # slots 为 None 时重置所有槽位
+        if slots is None:
+            self._lastTimestampMS[:] = np.nan
+        else:
+            self._lastTimestampMS[slots] = np.nan
+
+    def filter(self, values: np.ndarray, timestampMS: int, slots=None) -> np.ndarray:
+        # values 的形状是 (channelCount,) 或者 (n, channelCount)，第 i 行使用 slots[i] 号槽位
+        # 返回新的数组，形状和 values 相同，不会修改 values
+        values, slots, single = _prepareSlots(np.asarray(values, dtype=np.float64), slots)
+        dt, step, stale, restart = _classifyTimestamps(self._lastTimestampMS[slots], timestampMS, self._maxGapSecs)
+
+        # 大部分时候所有槽位都是正常更新
+        if step.all():
+            self._lastTimestampMS[slots] = timestampMS
+            result = self._step(values, dt[:, np.newaxis], slots)
+            return result[0] if single else result
+
+        result = np.empty_like(values)
+
+        if step.any():
+            result[step] = self._step(values[step], dt[step, np.newaxis], slots[step])
+
+        if stale.any():
+            result[stale] = self._current(slots[stale])
+
+        if restart.any():
+            self._init(values[restart], slots[restart])
+            result[restart] = values[restart]
+
+        self._lastTimestampMS[slots[~stale]] = timestampMS
+        return result[0] if single else result
+
+    def _init(self, values: np.ndarray, slots: np.ndarray):
+        pass
+
+    def _step(self, values: np.ndarray, dt: np.ndarray, slots: np.ndarray) -> np.ndarray:
+        return values.copy()
+
+    def _current(self, slots: np.ndarray) -> np.ndarray:
+        pass
+
+class OneEuroFilter(ChannelFilter):
+    # https://gery.casiez.net/1euro/
+    PARAMS = ('minCutoff', 'beta', 'dCutoff')
+
+    def __init__(self, channelCount: int, *, slotCount=1, minCutoff=1.0, beta=0.0, dCutoff=1.0, maxGapSecs=0.5):
+        super().__init__(channelCount, slotCount=slotCount, minCutoff=minCutoff, beta=beta, dCutoff=dCutoff, maxGapSecs=maxGapSecs)
+
+        # [0]: 值, [1]: 导数
+        self._state = np.zeros((2, slotCount, channelCount), dtype=np.float64)
+
+    def _init(self, values: np.ndarray, slots: np.ndarray):
+        self._state[0, slots] = values
+        self._state[1, slots] = 0
+
+    def _step(self, values: np.ndarray, dt: np.ndarray, slots: np.ndarray) -> np.ndarray:
+        x, dx = self._state[:, slots]
+
+        dxRaw = (values - x) / dt
+        dx += _smoothingFactor(self._dCutoff, dt) * (dxRaw - dx)
+
+        cutoff = self._minCutoff + self._beta * np.abs(dx)
+        x += _smoothingFactor(cutoff, dt) * (values - x)
+
+        self._state[0, slots] = x
+        self._state[1, slots] = dx
+        return x
+
+    def _current(self, slots: np.ndarray) -> np.ndarray:
+        return self._state[0, slots]
+
+class KalmanFilter(ChannelFilter):
+    # 匀速模型的卡尔曼滤波，每个通道独立
+    PARAMS = ('processNoise', 'measurementNoise')
+
+    def __init__(self, channelCount: int, *, slotCount=1, processNoise=1.0, measurementNoise=1e-3, maxGapSecs=0.5):
+        super().__init__(channelCount, slotCount=slotCount, processNoise=processNoise, measurementNoise=measurementNoise, maxGapSecs=maxGapSecs)
+
+        # [0]: 位置, [1]: 速度, [2..4]: 协方差矩阵 P00, P01, P11
+        self._state = np.zeros((5, slotCount, channelCount), dtype=np.float64)
+
+    def _init(self, values: np.ndarray, slots: np.ndarray):
+        self._state[0, slots] = values
+        self._state[1, slots] = 0
+        self._state[2, slots] = self._measurementNoise
+        self._state[3, slots] = 0
+        self._state[4, slots] = 1.0
+
+    def _step(self, values: np.ndarray, dt: np.ndarray, slots: np.ndarray) -> np.ndarray:
+        state = self._state[:, slots]
+        p, v, p00, p01, p11 = state
+        q = self._processNoise
+
+        # predict
+        p += v * dt
+        p00 += dt * (2 * p01 + dt * p11) + q * dt ** 3 / 3
+        p01 += dt * p11 + q * dt ** 2 / 2
+        p11 += q * dt
+
+        # update
+        s = p00 + self._measurementNoise
+        k0 = p00 / s
+        k1 = p01 / s
+        y = values - p
+
+        p += k0 * y
+        v += k1 * y
+        p11 -= k1 * p01
+        p01 *= 1 - k0
+        p00 *= 1 - k0
+
+        self._state[:, slots] = state
+        return p.copy()
+
+    def _current(self, slots: np.ndarray) -> np.ndarray:
+        return self._state[0, slots]
+
+class QuaternionFilter(object):
+    # 用 slerp 平滑旋转，插值系数按照 One Euro 的方式根据角速度自适应
+    # 和 ChannelFilter 一样，可以同时给 slotCount 个对象滤波
+    def __init__(self, *, slotCount=1, minCutoff=1.0, beta=0.0, dCutoff=1.0, maxGapSecs=0.5):
+        self._slotCount = slotCount
+        self._minCutoff = minCutoff
+        self._beta = beta
+        self._dCutoff = dCutoff
+        self._maxGapSecs = maxGapSecs
+
+        self._rotations = np.zeros((slotCount, 4), dtype=np.float64) # w, x, y, z
+        self._rotations[:, 0] = 1
+        self._angularSpeeds = np.zeros(slotCount, dtype=np.float64)
+        self._lastTimestampMS = np.full(slotCount, np.nan, dtype=np.float64)
+
+    @property
+    def slotCount(self) -> int:
+        return self._slotCount
+
+    def reset(self, slots=None):
+        if slots is None:
+            self._lastTimestampMS[:] = np.nan
+        else:
+            self._lastTimestampMS[slots] = np.nan
+
+    def filter(self, rotations: np.ndarray, timestampMS: int, slots=None) -> np.ndarray:
+        # rotations 的形状是 (4,) 或者 (n, 4)，返回新的数组，形状和 rotations 相同
+        rotations, slots, single = _prepareSlots(np.asarray(rotations, dtype=np.float64), slots)
+        dt, step, stale, restart = _classifyTimestamps(self._lastTimestampMS[slots], timestampMS, self._maxGapSecs)
+
+        # slerp 要求单位四元数，每一帧的输入都要归一化
+        rotations = rotations / np.linalg.norm(rotations, axis=-1, keepdims=True)
+
+        if step.any():
+            self._step(rotations[step], dt[step], slots[step])
+
+        if restart.any():
+            self._rotations[slots[restart]] = rotations[restart]
+            self._angularSpeeds[slots[restart]] = 0
+
+        self._lastTimestampMS[slots[~stale]] = timestampMS
+
+        result = self._rotations[slots]
+        return result[0] if single else result
+
+    def _step(self, rotations: np.ndarray, dt: np.ndarray, slots: np.ndarray):
+        current = self._rotations[slots]
+
+        # q 和 -q 表示同一个旋转，走短的那条路
+        dot = np.abs(np.sum(current * rotations, axis=-1))
+        angles = 2 * np.arccos(np.minimum(dot, 1.0))
+
+        angularSpeeds = self._angularSpeeds[slots]
+        angularSpeeds += _smoothingFactor(self._dCutoff, dt) * (angles / dt - angularSpeeds)
+        self._angularSpeeds[slots] = angularSpeeds
+
+        cutoff = self._minCutoff + self._beta * angularSpeeds
+
+        # 消除浮点误差的累积，结果一直在单位球面上
+        result = slerp(current, rotations, _smoothingFactor(cutoff, dt))
+        self._rotations[slots] = result / np.linalg.norm(result, axis=-1, keepdims=True)
+
+def slerp(a: np.ndarray, b: np.ndarray, t) -> np.ndarray:
+    # a、b 的形状是 (..., 4)，t 是标量或者形状为 (...) 的数组
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    t = np.asarray(t, dtype=np.float64)[..., np.newaxis]
+
+    dot = np.sum(a * b, axis=-1, keepdims=True)
+    b = np.where(dot < 0, -b, b)
+    dot = np.abs(dot)
+
+    # 夹角很小时退化成线性插值
+    linear = dot > 0.9995
+    theta = np.arccos(np.minimum(dot, 1.0))
+    sinTheta = np.where(linear, 1.0, np.sin(theta))
+
+    wa = np.where(linear, 1 - t, np.sin((1 - t) * theta) / sinTheta)
+    wb = np.where(linear, t, np.sin(t * theta) / sinTheta)
+
+    result = wa * a + wb * b
+    return np.where(linear, result / np.linalg.norm(result, axis=-1, keepdims=True), result)
+
+_CHANNEL_FILTER_TYPES = {
+    'oneEuro': OneEuroFilter,
+    'kalman': KalmanFilter,
+}
+
+def createChannelFilter(channelNames: typing.Sequence[str], type: str | None, channels: dict | None = None, *, slotCount=1,
+                        **params) -> ChannelFilter | None:
+    # params 里是每种滤波器的默认参数，例如 params['oneEuro'] = {'minCutoff': 1.0}
+    # channels 里是按通道名称单独设置的参数，只会用到当前滤波器认识的参数
+    # slotCount 是同时滤波的对象数量
+    if type is None:
+        return None
+
+    filterType = _CHANNEL_FILTER_TYPES[type]
+    result = filterType(len(channelNames), slotCount=slotCount, **params.get(type, {}))
+
+    if channels is not None:
+        for name, channelParams in channels.items():
+            channelParams = { k: v for k, v in channelParams.items() if k in filterType.PARAMS }
+            result.setChannelParams(channelNames.index(name), **channelParams)
+    return result
+
+def createQuaternionFilter(type: str | None, *, slotCount=1, **params) -> QuaternionFilter | None:
+    if type is None:
+        return None
+
+    if type != 'slerp':
+        raise ValueError(f'Unknown quaternion filter: {type}')
+    return QuaternionFilter(slotCount=slotCount, **params.get(type, {}))
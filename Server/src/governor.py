@@ -0,0 +1,107 @@
+import threading
+import time
+
+class AdaptiveGovernor(object):
+    # 根据推理耗时调整送去推理的帧率和分辨率，让输出帧率稳定在 targetFps 附近
+    # 推理跟不上时先降低分辨率，降到 minScale 还不够就只能跳帧
+    def __init__(self, *, enable=True, targetFps=30.0, minScale=0.5, maxScale=1.0, scaleStep=0.1,
+                 latencySmoothing=0.2, adjustIntervalSecs=1.0):
+        self._enable = enable
+        self._frameIntervalSecs = 1.0 / targetFps
+        self._minScale = minScale
+        self._maxScale = maxScale
+        self._scaleStep = scaleStep
+        self._latencySmoothing = latencySmoothing
+        self._adjustIntervalSecs = adjustIntervalSecs
+
+        # landmarker -> 平滑后的推理耗时（秒）
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+        self._scale = maxScale
+        self._lastAdmitTime = 0.0
+        self._lastAdjustTime = 0.0
+        self._skippedFrameCount = 0
+
+    @property
+    def scale(self) -> float:
+        # 推理输入相对于采集分辨率的缩放
+        return self._scale if self._enable else 1.0
+
+    @property
+    def latencySecs(self) -> float:
+        # 多个 Landmarker 的结果要全部返回，一帧才算处理完
+        self._lock.acquire()
+        try:
+            return max(self._latencies.values(), default=0.0)
+        finally:
+            self._lock.release()
+
+    @property
+    def skippedFrameCount(self) -> int:
+        return self._skippedFrameCount
+
+    def reset(self):
+        self._lock.acquire()
+        try:
+            self._latencies.clear()
+        finally:
+            self._lock.release()
+
+        self._scale = self._maxScale
+        self._lastAdmitTime = 0.0
+        self._lastAdjustTime = 0.0
+
+    def recordLatency(self, landmarker, latencySecs: float):
+        #! 在 Live Stream 模式下，这段代码在 mediapipe 的子线程执行
+        self._lock.acquire()
+        try:
+            lastLatencySecs = self._latencies.get(landmarker, None)
+
+            if lastLatencySecs is None:
+                self._latencies[landmarker] = latencySecs
+            else:
+                self._latencies[landmarker] = lastLatencySecs + self._latencySmoothing * (latencySecs - lastLatencySecs)
+        finally:
+            self._lock.release()
+
+    def admitFrame(self, canSkip=True) -> bool:
+        # 在推理线程调用。返回 False 时丢掉这一帧，不做转换和推理
+        # 推理还没结束时 mediapipe 也会丢掉新的帧，不如在转换之前就丢掉
+        # canSkip 为 False 时（例如视频文件的帧）只调整分辨率，不跳帧
+        if not self._enable:
+            return True
+
+        now = time.perf_counter()
+        latencySecs = self.latencySecs
+
+        if now - self._lastAdjustTime >= self._adjustIntervalSecs:
+            self._lastAdjustTime = now
+            self._adjustScale(latencySecs)
+
+        if not canSkip:
+            self._lastAdmitTime = now
+            return True
+
+        if now - self._lastAdmitTime < max(self._frameIntervalSecs, latencySecs):
+            self._skippedFrameCount += 1
+            return False
+
+        self._lastAdmitTime = now
+        return True
+
+    def _adjustScale(self, latencySecs: float):
+        scale = self._scale
+
+        # 留一些余量，避免在两个分辨率之间来回切换
+        if latencySecs > self._frameIntervalSecs * 0.9:
+            scale = max(self._minScale, scale - self._scaleStep)
+        elif latencySecs < self._frameIntervalSecs * 0.6:
+            scale = min(self._maxScale, scale + self._scaleStep)
+
+        # 避免浮点误差累积
+        scale = round(scale, 4)
+
+        if scale != self._scale:
+            self._scale = scale
+            print(f'Inference scale: {scale:.2f} (latency: {latencySecs * 1000:.1f}ms)')
@@ -1,2 +1,9 @@
 import handlers.handleHeartBeatReq
-import handlers.handleQuitNotify
\ No newline at end of file
+import handlers.handleQuitNotify
+import handlers.handleFaceSchemaReq
+import handlers.handleKeyframeReq
+import handlers.handleTimingReq
+import handlers.handlePing
+import handlers.handlePong
+import handlers.handleMulticastReq
+import handlers.handleSubscribeReq
\ No newline at end of file
@@ -0,0 +1,13 @@
+from server import UDPServer
+from packet import Packet
+from landmarkers.faceLandmarker import createFaceSchemaPacket
+from protos.packetCode_pb2 import PacketCode
+
+@UDPServer.clientPacketHandler(PacketCode.FACE_SCHEMA_REQ)
+def handleFaceSchemaReq(server: UDPServer, senderAddr, packet: Packet):
+    print(f'{senderAddr}: Face schema.')
+
+    # 之后只给这个客户端发送紧凑格式的 FaceData
+    server.subscribe(senderAddr, PacketCode.COMPACT_FACE_DATA)
+    server.unsubscribe(senderAddr, PacketCode.FACE_DATA)
+    server.send(createFaceSchemaPacket(), clientAddr=senderAddr)
@@ -0,0 +1,28 @@
+import channelStream
+
+from google.protobuf.message import DecodeError
+from server import UDPServer
+from packet import Packet
+from protos.keyframeRequest_pb2 import KeyframeRequest
+from protos.packetCode_pb2 import PacketCode
+
+# 订阅增量数据流以后，就不再需要的完整数据包
+_REPLACED_PACKET_CODES = {
+    PacketCode.FACE_DATA: (PacketCode.FACE_DATA, PacketCode.COMPACT_FACE_DATA),
+}
+
+@UDPServer.clientPacketHandler(PacketCode.KEYFRAME_REQ)
+def handleKeyframeReq(server: UDPServer, senderAddr, packet: Packet):
+    try:
+        request = KeyframeRequest.FromString(bytes(packet.payloadBytes))
+    except DecodeError:
+        print(f'A bad KEYFRAME_REQ was received from {senderAddr}!')
+        return
+
+    print(f'{senderAddr}: Keyframe of {PacketCode.Name(request.stream)}.')
+
+    server.subscribe(senderAddr, PacketCode.KEYFRAME_DATA, PacketCode.DELTA_DATA)
+    server.unsubscribe(senderAddr, *_REPLACED_PACKET_CODES.get(request.stream, ()))
+
+    if not channelStream.requestKeyframe(request.stream):
+        print(f'Stream \'{PacketCode.Name(request.stream)}\' has no encoder!')
@@ -0,0 +1,15 @@
+from server import UDPServer
+from packet import Packet
+from protos.packetCode_pb2 import PacketCode
+
+@UDPServer.clientPacketHandler(PacketCode.MULTICAST_REQ)
+def handleMulticastReq(server: UDPServer, senderAddr, packet: Packet):
+    # 之后 FACE_DATA 等数据包只通过组播发给这个客户端
+    rsp = server.joinMulticast(senderAddr)
+
+    if rsp is None:
+        print(f'{senderAddr}: Multicast was refused before the heart beat!')
+        return
+
+    print(f'{senderAddr}: Multicast.')
+    server.send(rsp, clientAddr=senderAddr)
@@ -0,0 +1,8 @@
+from server import UDPServer
+from packet import Packet
+from protos.packetCode_pb2 import PacketCode
+
+@UDPServer.clientPacketHandler(PacketCode.PING)
+def handlePing(server: UDPServer, senderAddr, packet: Packet):
+    # 客户端测量往返时间，原样发回去
+    server.send(Packet(PacketCode.PONG, packet.payloadBytes), clientAddr=senderAddr)
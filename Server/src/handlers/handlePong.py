@@ -0,0 +1,15 @@
+from google.protobuf.message import DecodeError
+from server import UDPServer
+from packet import Packet
+from protos.packetCode_pb2 import PacketCode
+from protos.ping_pb2 import Ping
+
+@UDPServer.clientPacketHandler(PacketCode.PONG)
+def handlePong(server: UDPServer, senderAddr, packet: Packet):
+    try:
+        ping = Ping.FromString(bytes(packet.payloadBytes))
+    except DecodeError:
+        print(f'A bad PONG was received from {senderAddr}!')
+        return
+
+    server.handlePong(senderAddr, ping)
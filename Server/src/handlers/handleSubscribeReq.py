@@ -0,0 +1,20 @@
+from google.protobuf.message import DecodeError
+from server import UDPServer
+from packet import Packet
+from protos.packetCode_pb2 import PacketCode
+from protos.subscription_pb2 import Subscription
+
+@UDPServer.clientPacketHandler(PacketCode.SUBSCRIBE_REQ)
+def handleSubscribeReq(server: UDPServer, senderAddr, packet: Packet):
+    try:
+        subscription = Subscription.FromString(bytes(packet.payloadBytes))
+    except DecodeError:
+        print(f'A bad SUBSCRIBE_REQ was received from {senderAddr}!')
+        return
+
+    codes = ', '.join(PacketCode.Name(c) if c in PacketCode.values() else str(c) for c in subscription.packetCodes)
+    print(f'{senderAddr}: Subscribe [{codes}] sources={list(subscription.sourceIds)} subjects={list(subscription.subjectIds)} maxRate={subscription.maxRate:g}.')
+
+    # 之后只给这个客户端发送它需要的数据包、采集源和对象，并且按 maxRate 降频
+    server.setSubscription(senderAddr, subscription.packetCodes, subscription.subjectIds, subscription.maxRate,
+                           subscription.sourceIds)
@@ -0,0 +1,10 @@
+from server import UDPServer
+from packet import Packet
+from protos.packetCode_pb2 import PacketCode
+
+@UDPServer.clientPacketHandler(PacketCode.TIMING_REQ)
+def handleTimingReq(server: UDPServer, senderAddr, packet: Packet):
+    print(f'{senderAddr}: Timing.')
+
+    # 之后给这个客户端发送带时间戳和序号的扩展包头，并且定期发送 PING
+    server.enableTiming(senderAddr)
@@ -2,4 +2,13 @@ from landmarkers.landmarker import Landmarker
 from landmarkers.landmarker import LandmarkerGroup
 
 from landmarkers.faceLandmarker import FaceLandmarker
-from landmarkers.poseLandmarker import PoseLandmarker
\ No newline at end of file
+from landmarkers.faceLandmarker import BLEND_SHAPE_NAMES
+from landmarkers.poseLandmarker import PoseLandmarker
+from landmarkers.handLandmarker import HandLandmarker
+
+from landmarkers.roiTracker import Roi
+from landmarkers.roiTracker import RoiTracker
+from landmarkers.roiTracker import createRoiTracker
+
+from landmarkers.subjectTracker import Subjects
+from landmarkers.subjectTracker import SubjectTracker
\ No newline at end of file
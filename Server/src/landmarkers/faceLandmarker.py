@@ -1,37 +1,66 @@
 import mediapipe as mp
 import numpy as np
-
-from landmarkers.landmarker import Landmarker
+import typing
+import mathutils
+
+from channelStream import ChannelStreamEncoder
+from filters import ChannelFilter, QuaternionFilter
+from landmarkers.landmarker import Landmarker, _createImage
+from landmarkers.roiTracker import Roi, RoiTracker
+from landmarkers.subjectTracker import Subjects
 from server import UDPServer
 from packet import Packet
 from protos.faceData_pb2 import FaceData
+from protos.compactFaceData_pb2 import CompactFaceData
+from protos.faceSchema_pb2 import FaceSchema
 from protos.packetCode_pb2 import PacketCode
 
 FaceLandmarkerResult = mp.tasks.vision.FaceLandmarkerResult
 
-def _extractRotation(outQuaternion, matrix):
-    try:
-        matrix = matrix[:3, :3]
-        matrix /= np.linalg.norm(matrix, axis=0)
-
-        w = np.sqrt(np.maximum(0, 1 + matrix[0, 0] + matrix[1, 1] + matrix[2, 2])) * 0.5
-        x = np.sqrt(np.maximum(0, 1 + matrix[0, 0] - matrix[1, 1] - matrix[2, 2])) * 0.5
-        y = np.sqrt(np.maximum(0, 1 - matrix[0, 0] + matrix[1, 1] - matrix[2, 2])) * 0.5
-        z = np.sqrt(np.maximum(0, 1 - matrix[0, 0] - matrix[1, 1] + matrix[2, 2])) * 0.5
-
-        x = np.copysign(x, matrix[2, 1] - matrix[1, 2])
-        y = np.copysign(y, matrix[0, 2] - matrix[2, 0])
-        z = np.copysign(z, matrix[1, 0] - matrix[0, 1])
-
-        # Unity 是左手系。Y 轴向上，Z 轴向前，X 轴向右
-        # mediapipe 是右手系。Y 轴向上，Z 轴向前，X 轴向左
-        # rotation.w == cos(theta/2) 偶函数，不用管
-        outQuaternion.w = w
-        outQuaternion.x = x
-        outQuaternion.y = -y
-        outQuaternion.z = -z
-    except Exception as e:
-        print(e)
+# mediapipe 输出的 BlendShape 名称，下标和 Category.index 一致
+BLEND_SHAPE_NAMES = (
+    '_neutral',
+    'browDownLeft', 'browDownRight', 'browInnerUp', 'browOuterUpLeft', 'browOuterUpRight',
+    'cheekPuff', 'cheekSquintLeft', 'cheekSquintRight',
+    'eyeBlinkLeft', 'eyeBlinkRight', 'eyeLookDownLeft', 'eyeLookDownRight',
+    'eyeLookInLeft', 'eyeLookInRight', 'eyeLookOutLeft', 'eyeLookOutRight',
+    'eyeLookUpLeft', 'eyeLookUpRight', 'eyeSquintLeft', 'eyeSquintRight', 'eyeWideLeft', 'eyeWideRight',
+    'jawForward', 'jawLeft', 'jawOpen', 'jawRight',
+    'mouthClose', 'mouthDimpleLeft', 'mouthDimpleRight', 'mouthFrownLeft', 'mouthFrownRight',
+    'mouthFunnel', 'mouthLeft', 'mouthLowerDownLeft', 'mouthLowerDownRight',
+    'mouthPressLeft', 'mouthPressRight', 'mouthPucker', 'mouthRight',
+    'mouthRollLower', 'mouthRollUpper', 'mouthShrugLower', 'mouthShrugUpper',
+    'mouthSmileLeft', 'mouthSmileRight', 'mouthStretchLeft', 'mouthStretchRight',
+    'mouthUpperUpLeft', 'mouthUpperUpRight',
+    'noseSneerLeft', 'noseSneerRight',
+)
+
+def createFaceSchemaPacket() -> Packet:
+    faceSchema = FaceSchema()
+    faceSchema.blendShapeNames.extend(BLEND_SHAPE_NAMES)
+    return Packet(PacketCode.FACE_SCHEMA_RSP, faceSchema.SerializeToString())
+
+def _extractBlendShapes(blendShapesList) -> np.ndarray:
+    # 返回形状为 (n, len(BLEND_SHAPE_NAMES)) 的数组，每行是一张脸
+    values = np.zeros((len(blendShapesList), len(BLEND_SHAPE_NAMES)), dtype=np.float32)
+
+    for i, blendShapes in enumerate(blendShapesList):
+        for blendShapeData in blendShapes:
+            if 0 <= blendShapeData.index < values.shape[1]:
+                values[i, blendShapeData.index] = blendShapeData.score
+    return values
+
+def _quantizeBlendShapes(values: np.ndarray) -> np.ndarray:
+    # [0, 1] -> [0, 65535]，精度约 1.5e-5。返回小端序 uint16 数组，形状和 values 相同
+    values = np.clip(values, 0, 1)
+    return np.rint(values * 65535).astype('<u2')
+
+def _extractRotations(matrices) -> np.ndarray:
+    # 所有脸一起计算，返回形状为 (n, 4) 的 Unity 四元数
+    return mathutils.toUnityQuaternions(mathutils.matrixToQuaternions(np.asarray(matrices)))
+
+def _setQuaternion(outQuaternion, rotation: np.ndarray):
+    outQuaternion.w, outQuaternion.x, outQuaternion.y, outQuaternion.z = rotation.tolist()
 
 class FaceLandmarker(Landmarker):
     CONFIG = {
@@ -45,14 +74,84 @@ class FaceLandmarker(Landmarker):
         'landmark_drawing_connection_spec': mp.solutions.drawing_styles.get_default_face_mesh_contours_style(),
 
         # face landmarker options
+        'num_faces': 1,
         'min_face_detection_confidence': 0.8,
         'output_face_blendshapes': True,
         'output_facial_transformation_matrixes': True,
     }
 
-    def __init__(self, server: UDPServer, **kwargs):
+    def __init__(self, server: UDPServer, *, blend_shape_filter: ChannelFilter | None = None,
+                 head_rotation_filter: QuaternionFilter | None = None, delta_stream_options: dict | None = None,
+                 roi_tracker: RoiTracker | None = None, **kwargs):
         super().__init__(server, **kwargs)
 
+        self._blendShapeFilter = blend_shape_filter
+        self._headRotationFilter = head_rotation_filter
+        self._roiTracker = roi_tracker
+
+        # 只裁剪一张脸附近的区域
+        if roi_tracker is not None and self.maxSubjectCount > 1:
+            print('ROI tracking only works with one face. It is disabled.')
+            self._roiTracker = None
+
+        for f in (blend_shape_filter, head_rotation_filter):
+            if f is not None and f.slotCount < self.maxSubjectCount:
+                raise ValueError(f'The filter has {f.slotCount} slots but num_faces is {self.maxSubjectCount}!')
+
+        # 增量数据流的通道：头部旋转 (w, x, y, z)，然后是 BLEND_SHAPE_NAMES 里的所有 BlendShape
+        # 每个槽位一个 encoder，序号各自独立
+        self._deltaStreamEncoders = [
+            ChannelStreamEncoder(PacketCode.FACE_DATA, 4 + len(BLEND_SHAPE_NAMES), sourceId=self.sourceId, **(delta_stream_options or {}))
+            for _ in range(self.maxSubjectCount)
+        ]
+
+    @property
+    def maxSubjectCount(self) -> int:
+        return self._landmarkerOptions.num_faces
+
+    def stop(self):
+        super().stop()
+
+        if self._blendShapeFilter is not None:
+            self._blendShapeFilter.reset()
+
+        if self._headRotationFilter is not None:
+            self._headRotationFilter.reset()
+
+        for encoder in self._deltaStreamEncoders:
+            encoder.reset()
+
+        if self._roiTracker is not None:
+            self._roiTracker.reset()
+
+    def close(self):
+        super().close()
+
+        # encoder 注册在 channelStream 里，不移除就会一直收到 KEYFRAME_REQ
+        for encoder in self._deltaStreamEncoders:
+            encoder.close()
+
+    def _prepareImage(self, img: np.ndarray) -> tuple[mp.Image, tuple[int, int, Roi | None]]:
+        if self._roiTracker is None:
+            return super()._prepareImage(img)
+
+        # 只把脸附近的区域送去推理
+        roiImg, roi = self._roiTracker.crop(img)
+        return _createImage(roiImg), (img.shape[1], img.shape[0], roi)
+
+    def _restoreResult(self, result: FaceLandmarkerResult, frameContext: tuple[int, int, Roi | None] | None):
+        if self._roiTracker is None or frameContext is None:
+            return
+
+        frameWidth, frameHeight, roi = frameContext
+
+        if len(result.face_landmarks) == 0:
+            self._roiTracker.track(None, frameWidth, frameHeight)
+            return
+
+        self._roiTracker.restoreLandmarks(result.face_landmarks[0], roi)
+        self._roiTracker.track(result.face_landmarks[0], frameWidth, frameHeight)
+
     def _checkIsResultValid(self, result: FaceLandmarkerResult) -> bool:
         return all([
             len(result.face_blendshapes) > 0,
@@ -60,19 +159,73 @@ class FaceLandmarker(Landmarker):
             len(result.face_landmarks) > 0,
         ])
 
-    def _createPacket(self, result: FaceLandmarkerResult, outputImage: mp.Image, timestampMS: int) -> Packet:
-        faceData = FaceData()
+    def _createPackets(self, result: FaceLandmarkerResult, outputImage: mp.Image, timestampMS: int, subjects: Subjects) -> typing.Iterable[Packet]:
+        # 所有脸一起处理，只在最后组装数据包时逐个处理
+        faceCount = min(len(result.facial_transformation_matrixes), len(result.face_blendshapes), len(subjects.ids))
+        tracked = [i for i in range(faceCount) if subjects.ids[i] > 0]
 
-        # head rotation
-        _extractRotation(faceData.headRotation, result.facial_transformation_matrixes[0])
+        if len(tracked) == 0:
+            return
 
-        # blend shape value
-        for blendShapeData in result.face_blendshapes[0]:
-            item = faceData.blendShapes.add()
-            item.name = blendShapeData.category_name
-            item.value = round(blendShapeData.score, 4)
+        ids = [subjects.ids[i] for i in tracked]
+        slots = subjects.slots[tracked]
+
+        # 槽位换了新的人，之前的滤波器状态不能再用了
+        if len(subjects.newSlots) > 0:
+            for f in (self._headRotationFilter, self._blendShapeFilter):
+                if f is not None:
+                    f.reset(subjects.newSlots)
 
-        return Packet(PacketCode.FACE_DATA, faceData.SerializeToString())
+            for slot in subjects.newSlots:
+                self._deltaStreamEncoders[slot].reset()
 
-    def _getDrawingLandmarks(self, result: FaceLandmarkerResult):
-        return result.face_landmarks[0]
+        # head rotation
+        rotations = _extractRotations([result.facial_transformation_matrixes[i] for i in tracked])
+        if self._headRotationFilter is not None:
+            rotations = self._headRotationFilter.filter(rotations, timestampMS, slots)
+
+        # blend shape value
+        blendShapes = _extractBlendShapes([result.face_blendshapes[i] for i in tracked])
+        if self._blendShapeFilter is not None:
+            blendShapes = self._blendShapeFilter.filter(blendShapes, timestampMS, slots)
+
+        # 旧客户端使用的格式，每帧都带上 BlendShape 名称
+        if self._server.hasSubscribers(PacketCode.FACE_DATA):
+            roundedBlendShapes = np.round(blendShapes, 4).tolist()
+
+            for subjectId, rotation, values in zip(ids, rotations, roundedBlendShapes):
+                faceData = FaceData()
+                faceData.subjectId = subjectId
+                faceData.sourceId = self.sourceId
+                _setQuaternion(faceData.headRotation, rotation)
+
+                for name, value in zip(BLEND_SHAPE_NAMES, values):
+                    item = faceData.blendShapes.add()
+                    item.name = name
+                    item.value = value
+
+                yield Packet(PacketCode.FACE_DATA, faceData.SerializeToString(), subjectId=subjectId)
+
+        # 紧凑格式，名称通过 FACE_SCHEMA_RSP 只发一次
+        if self._server.hasSubscribers(PacketCode.COMPACT_FACE_DATA):
+            quantizedBlendShapes = _quantizeBlendShapes(blendShapes)
+
+            for subjectId, rotation, values in zip(ids, rotations, quantizedBlendShapes):
+                compactFaceData = CompactFaceData()
+                compactFaceData.subjectId = subjectId
+                compactFaceData.sourceId = self.sourceId
+                _setQuaternion(compactFaceData.headRotation, rotation)
+                compactFaceData.blendShapeValues = values.tobytes()
+                yield Packet(PacketCode.COMPACT_FACE_DATA, compactFaceData.SerializeToString(), subjectId=subjectId)
+
+        # 增量格式，只发送变化了的通道
+        if self._server.hasSubscribers(PacketCode.DELTA_DATA):
+            channels = np.concatenate((rotations, blendShapes), axis=-1)
+
+            for subjectId, slot, values in zip(ids, slots.tolist(), channels):
+                packet = self._deltaStreamEncoders[slot].encode(values, subjectId)
+                if packet is not None:
+                    yield packet
+
+    def _getSubjectLandmarks(self, result: FaceLandmarkerResult):
+        return result.face_landmarks
@@ -0,0 +1,66 @@
+import mediapipe as mp
+import typing
+
+from landmarkers.landmarker import Landmarker, fillLandmarkData
+from landmarkers.subjectTracker import Subjects
+from server import UDPServer
+from packet import Packet
+from protos.handData_pb2 import HandData
+from protos.packetCode_pb2 import PacketCode
+
+HandLandmarkerResult = mp.tasks.vision.HandLandmarkerResult
+
+class HandLandmarker(Landmarker):
+    CONFIG = {
+        # landmarker options
+        'landmarker_type': mp.tasks.vision.HandLandmarker,
+        'landmarker_options_type': mp.tasks.vision.HandLandmarkerOptions,
+
+        # draw landmark options
+        'landmark_drawing_spec': mp.solutions.drawing_styles.get_default_hand_landmarks_style(),
+        'landmark_drawing_connections': mp.solutions.hands.HAND_CONNECTIONS,
+
+        # hand landmarker options
+        'num_hands': 2,
+        'min_hand_detection_confidence': 0.8,
+        'min_hand_presence_confidence': 0.8,
+        'min_tracking_confidence': 0.8,
+    }
+
+    def __init__(self, server: UDPServer, *, world_landmarks=True, **kwargs):
+        super().__init__(server, **kwargs)
+
+        self._worldLandmarks = world_landmarks
+
+    @property
+    def maxSubjectCount(self) -> int:
+        return self._landmarkerOptions.num_hands
+
+    def _checkIsResultValid(self, result: HandLandmarkerResult) -> bool:
+        return len(result.hand_landmarks) > 0
+
+    def _createPackets(self, result: HandLandmarkerResult, outputImage: mp.Image, timestampMS: int, subjects: Subjects) -> typing.Iterable[Packet]:
+        if not self._server.hasSubscribers(PacketCode.HAND_DATA):
+            return
+
+        # 每只手一个数据包
+        for i, landmarks in enumerate(result.hand_landmarks):
+            if subjects.ids[i] == 0:
+                continue
+
+            worldLandmarks = None
+            if self._worldLandmarks and i < len(result.hand_world_landmarks):
+                worldLandmarks = result.hand_world_landmarks[i]
+
+            handData = HandData()
+            handData.subjectId = subjects.ids[i]
+            handData.sourceId = self.sourceId
+            if i < len(result.handedness) and result.handedness[i][0].category_name == 'Right':
+                handData.handedness = 1
+
+            # 手部模型不输出可见性，visibility 都是 None，会被当作可见
+            fillLandmarkData(handData, landmarks, worldLandmarks, 0.0)
+            yield Packet(PacketCode.HAND_DATA, handData.SerializeToString(), subjectId=handData.subjectId)
+
+    def _getSubjectLandmarks(self, result: HandLandmarkerResult):
+        return result.hand_landmarks
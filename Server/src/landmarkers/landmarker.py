@@ -1,9 +1,20 @@
+import mathutils
 import mediapipe as mp
-
-from datetime import datetime
+import numpy as np
+import threading
+import time
+import typing
+
+from concurrent.futures import ThreadPoolExecutor
+from cvutils import frameCopyStats
+from metrics import metrics
 from packet import Packet
 from server import UDPServer
+from timing import monotonicMS
+from landmarkers.subjectTracker import SubjectTracker, Subjects, landmarkBoxes
 from mediapipe.framework.formats import landmark_pb2
+from protos.frameData_pb2 import FrameData
+from protos.packetCode_pb2 import PacketCode
 
 BaseOptions = mp.tasks.BaseOptions
 VisionRunningMode = mp.tasks.vision.RunningMode
@@ -23,6 +34,34 @@ def _mergeConfig(obj, **kwargs) -> dict:
         results.update(config)
     return results
 
+def _nextTimestampMS(lastTimestampMS: int) -> int:
+    # mediapipe 要求时间戳严格递增，同一毫秒里的两帧要错开
+    return max(monotonicMS(), lastTimestampMS + 1)
+
+def _createImage(img: np.ndarray) -> mp.Image:
+    # mp.Image 会把数据复制一份
+    frameCopyStats.addCopy(img.nbytes)
+    return mp.Image(image_format=mp.ImageFormat.SRGB, data=img)
+
+def landmarksToArray(landmarks) -> np.ndarray:
+    # 返回形状为 (n, 4) 的 float32 数组 (x, y, z, visibility)。没有 visibility 的 landmark 当作可见
+    return np.array([
+        (l.x, l.y, l.z, 1.0 if l.visibility is None else l.visibility) for l in landmarks
+    ], dtype=np.float32).reshape(-1, 4)
+
+def fillLandmarkData(data, landmarks, worldLandmarks, visibilityThreshold: float):
+    # 填充 PoseData 和 HandData 共有的字段。坐标一次性转换到 Unity 坐标系，打包成 float32 数组
+    # worldLandmarks 为 None 时不发送世界坐标
+    points = landmarksToArray(landmarks)
+
+    data.landmarkCount = len(points)
+    data.packedLandmarks = mathutils.toUnityLandmarks(points[:, :3].copy(), True).astype('<f4', copy=False).tobytes()
+    data.visibilityMask = np.packbits(points[:, 3] >= visibilityThreshold, bitorder='little').tobytes()
+
+    if worldLandmarks is not None:
+        worldPoints = landmarksToArray(worldLandmarks)[:, :3].copy()
+        data.packedWorldLandmarks = mathutils.toUnityLandmarks(worldPoints, False).astype('<f4', copy=False).tobytes()
+
 class Landmarker(object):
     CONFIG = {
         # base options
@@ -41,15 +80,30 @@ class Landmarker(object):
         'landmark_drawing_connection_spec': mp.solutions.drawing_utils.DrawingSpec(),
     }
 
-    def __init__(self, server: UDPServer, **kwargs):
+    def __init__(self, server: UDPServer, *, subject_tracking_options: dict | None = None, source_id=0, **kwargs):
         config = _mergeConfig(self, **kwargs)
         landmarkerOptionsType = config.pop('landmarker_options_type')
 
         self._server = server
-        self._startTime = datetime.now()
+        self._sourceId = source_id
         self._landmarker = None
+        self._frameMerger = None
+        self._lastTimestampMS = -1
+
+        # 每得到一帧结果加一，写进扩展包头，客户端可以用它检查丢帧
+        self._frameSequence = 0
+
+        # 还没有结果的帧。timestampMS -> (调用 detect 的时间, _prepareImage 返回的 frameContext)
+        self._latencyListener = None
+        self._pendingFrames = {}
+        self._pendingFramesLock = threading.Lock()
         self._landmarkDrawingList = None
 
+        name = type(self).__name__
+        self._inferenceStats = metrics.stage(f'{name}.inference')
+        self._callbackStats = metrics.stage(f'{name}.callback')
+        self._createPacketsStats = metrics.stage(f'{name}.createPackets')
+
         self._landmarkDrawingSpec = config.pop('landmark_drawing_spec')
         self._landmarkDrawingConnections = config.pop('landmark_drawing_connections')
         self._landmarkDrawingConnectionSpec = config.pop('landmark_drawing_connection_spec')
@@ -67,14 +121,31 @@ class Landmarker(object):
         if self._landmarkerOptions.running_mode == VisionRunningMode.LIVE_STREAM:
             self._landmarkerOptions.result_callback = self._resultCallback
 
+        # 给同时检测到的多个对象分配稳定的 ID
+        self._subjectTracker = SubjectTracker(self.maxSubjectCount, **(subject_tracking_options or {}))
+
     @property
     def runningMode(self) -> VisionRunningMode:
         return self._landmarkerOptions.running_mode
 
+    @property
+    def maxSubjectCount(self) -> int:
+        # 每帧最多检测几个对象，例如 num_faces
+        return 1
+
+    @property
+    def sourceId(self) -> int:
+        # 处理的是哪个采集源的画面，写进每个数据包
+        return self._sourceId
+
     def __enter__(self):
         return self
 
     def __exit__(self, *args, **kwargs):
+        self.close()
+
+    def close(self):
+        # stop 之后还能继续 detect，close 之后不能。释放注册到别处的东西
         self.stop()
 
     def stop(self):
@@ -83,16 +154,63 @@ class Landmarker(object):
 
         self._landmarker.close()
         self._landmarker = None
+        self._subjectTracker.reset()
+
+        self._pendingFramesLock.acquire()
+        try:
+            self._pendingFrames.clear()
+        finally:
+            self._pendingFramesLock.release()
+
+    def setLatencyListener(self, listener: typing.Callable[['Landmarker', float], None] | None):
+        # 每次得到推理结果时调用 listener(landmarker, latencySecs)
+        self._latencyListener = listener
 
-    def detect(self, mpImage: mp.Image):
+    def _beginFrame(self, timestampMS: int, frameContext):
+        self._pendingFramesLock.acquire()
+        try:
+            self._pendingFrames[timestampMS] = (time.perf_counter_ns(), frameContext)
+
+            # Live Stream 模式下被 mediapipe 丢掉的帧不会有结果
+            while len(self._pendingFrames) > 32:
+                del self._pendingFrames[next(iter(self._pendingFrames))]
+        finally:
+            self._pendingFramesLock.release()
+
+    def _endFrame(self, timestampMS: int):
+        # 返回这一帧的 frameContext
+        self._pendingFramesLock.acquire()
+        try:
+            startNS, frameContext = self._pendingFrames.pop(timestampMS, (None, None))
+        finally:
+            self._pendingFramesLock.release()
+
+        if startNS is None:
+            return frameContext
+
+        latencyNS = time.perf_counter_ns() - startNS
+        self._inferenceStats.record(latencyNS)
+
+        listener = self._latencyListener
+        if listener is not None:
+            listener(self, latencyNS / 1e9)
+        return frameContext
+
+    def detect(self, img: np.ndarray, timestampMS: int | None = None):
+        # img 是 RGB 格式的图像
         landmarker = self._landmarker
 
         if landmarker is None:
             landmarker = self._landmarkerType.create_from_options(self._landmarkerOptions)
             self._landmarker = landmarker
-            self._startTime = datetime.now()
 
-        timestampMS = int((datetime.now() - self._startTime).total_seconds() * 1000)
+        # 一般由调用方传入帧的采集时间，处理视频文件时传入帧在视频里的时间
+        if timestampMS is None:
+            timestampMS = _nextTimestampMS(self._lastTimestampMS)
+        self._lastTimestampMS = timestampMS
+
+        mpImage, frameContext = self._prepareImage(img)
+        self._beginFrame(timestampMS, frameContext)
 
         match self.runningMode:
             case VisionRunningMode.LIVE_STREAM:
@@ -110,67 +228,218 @@ class Landmarker(object):
                 raise NotImplementedError(self.runningMode)
 
     def drawLandmarks(self, img):
-        if self._landmarkDrawingList is None:
+        drawingLists = self._landmarkDrawingList
+
+        if drawingLists is None:
             return
 
-        mp.solutions.drawing_utils.draw_landmarks(
-            image=img,
-            landmark_list=self._landmarkDrawingList,
-            landmark_drawing_spec=self._landmarkDrawingSpec,
-            connections=self._landmarkDrawingConnections,
-            connection_drawing_spec=self._landmarkDrawingConnectionSpec)
+        for drawingList in drawingLists:
+            mp.solutions.drawing_utils.draw_landmarks(
+                image=img,
+                landmark_list=drawingList,
+                landmark_drawing_spec=self._landmarkDrawingSpec,
+                connections=self._landmarkDrawingConnections,
+                connection_drawing_spec=self._landmarkDrawingConnectionSpec)
 
     def _resultCallback(self, result, outputImage: mp.Image, timestampMS: int):
         #! 在 Live Stream 模式下，这段代码在子线程执行！
 
+        callbackStartNS = time.perf_counter_ns()
+        frameContext = self._endFrame(timestampMS)
+
         # clear cache
         self._landmarkDrawingList = None
+        packets = []
 
         try:
+            self._restoreResult(result, frameContext)
+
+            # 没有检测到对象时也要更新，这样才知道对象丢了几帧
+            subjectLandmarks = self._getSubjectLandmarks(result)
+            subjects = self._subjectTracker.track(landmarkBoxes(subjectLandmarks))
+
             if not self._checkIsResultValid(result):
                 return
 
-            # send packet
-            packet = self._createPacket(result, outputImage, timestampMS)
-            self._server.send(packet)
+            # 包括 protobuf 序列化
+            startNS = time.perf_counter_ns()
+            packets.extend(self._createPackets(result, outputImage, timestampMS, subjects))
+            self._createPacketsStats.since(startNS)
 
             # update drawing landmarks
-            drawingList = landmark_pb2.NormalizedLandmarkList()
-            drawingList.landmark.extend(
-                landmark_pb2.NormalizedLandmark(x=landmark.x, y=landmark.y, z=landmark.z)
-                for landmark in self._getDrawingLandmarks(result)
-            )
-            self._landmarkDrawingList = drawingList #! 赋值放在最后，保证线程安全
+            drawingLists = []
+            for landmarks in subjectLandmarks:
+                drawingList = landmark_pb2.NormalizedLandmarkList()
+                drawingList.landmark.extend(
+                    landmark_pb2.NormalizedLandmark(x=landmark.x, y=landmark.y, z=landmark.z)
+                    for landmark in landmarks
+                )
+                drawingLists.append(drawingList)
+            self._landmarkDrawingList = drawingLists #! 赋值放在最后，保证线程安全
         except Exception as e:
             self._landmarkDrawingList = None
             print(e)
+        finally:
+            # 结果无效时也要通知 _FrameMerger，否则它会一直等这一帧
+            self._sendPackets(packets, timestampMS)
+            self._callbackStats.since(callbackStartNS)
+
+    def _sendPackets(self, packets: list[Packet], timestampMS: int):
+        frameMerger = self._frameMerger
+
+        if frameMerger is not None:
+            frameMerger.add(timestampMS, packets)
+            return
+
+        if len(packets) == 0:
+            return
+
+        self._frameSequence = (self._frameSequence + 1) & 0xFFFFFFFF
+
+        for packet in packets:
+            packet.timestampMS = timestampMS
+            packet.sequence = self._frameSequence
+            packet.sourceId = self._sourceId
+            self._server.send(packet)
+
+    def _prepareImage(self, img: np.ndarray) -> tuple[mp.Image, typing.Any]:
+        # 返回 (送去推理的图像, frameContext)。frameContext 会在得到结果时传给 _restoreResult
+        return _createImage(img), None
+
+    def _restoreResult(self, result, frameContext):
+        # 把推理结果还原到原图上，直接修改 result
+        pass
 
     def _checkIsResultValid(self, result) -> bool:
         return False
 
-    def _createPacket(self, result, outputImage: mp.Image, timestampMS: int) -> Packet:
-        pass
+    def _createPackets(self, result, outputImage: mp.Image, timestampMS: int, subjects: Subjects) -> typing.Iterable[Packet]:
+        # subjects 里是每个检测结果的 ID 和槽位，ID 为 0 的结果没有分配到槽位，应该跳过
+        return ()
 
-    def _getDrawingLandmarks(self, result):
-        pass
+    def _getSubjectLandmarks(self, result) -> list:
+        # 返回每个检测结果的归一化 landmark，用来跟踪对象和绘制
+        return []
+
+class _FrameMerger(object):
+    # 把同一帧里所有 Landmarker 的数据包合并成一个 FRAME_DATA
+    #! 在 Live Stream 模式下，add 会在 mediapipe 的多个线程里调用
+    def __init__(self, server: UDPServer, landmarkerCount: int, *, maxPendingFrames=8, sourceId=0):
+        self._server = server
+        self._sourceId = sourceId
+        self._landmarkerCount = landmarkerCount
+        self._maxPendingFrames = maxPendingFrames
+
+        # timestampMS -> [还没返回结果的 Landmarker 数量, 数据包]
+        self._pendingFrames = {}
+        self._frameSequence = 0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        self._lock.acquire()
+        try:
+            self._pendingFrames.clear()
+        finally:
+            self._lock.release()
+
+    def add(self, timestampMS: int, packets: list[Packet]):
+        self._lock.acquire()
+        try:
+            frame = self._pendingFrames.get(timestampMS, None)
+
+            if frame is None:
+                frame = [self._landmarkerCount, []]
+                self._pendingFrames[timestampMS] = frame
+
+            frame[0] -= 1
+            frame[1].extend(packets)
+
+            if frame[0] <= 0:
+                # Live Stream 模式下 mediapipe 忙的时候会跳过一些帧，更早的帧不会再等到所有结果了
+                self._flush(lambda t: t <= timestampMS)
+            elif len(self._pendingFrames) > self._maxPendingFrames:
+                oldestTimestampMS = min(self._pendingFrames)
+                self._flush(lambda t: t == oldestTimestampMS)
+        finally:
+            self._lock.release()
+
+    def _flush(self, predicate: typing.Callable[[int], bool]):
+        # 按时间顺序发送。在锁里发送，保证帧的顺序
+        for timestampMS in sorted(t for t in self._pendingFrames if predicate(t)):
+            _, packets = self._pendingFrames.pop(timestampMS)
+
+            if len(packets) == 0:
+                continue
+
+            frameData = FrameData()
+            frameData.timestampMS = timestampMS
+            frameData.sourceId = self._sourceId
+            frameData.packets.extend(bytes(p.encode()) for p in packets)
+
+            self._frameSequence = (self._frameSequence + 1) & 0xFFFFFFFF
+            self._server.send(Packet(PacketCode.FRAME_DATA, frameData.SerializeToString(),
+                                     timestampMS=timestampMS, sequence=self._frameSequence, sourceId=self._sourceId))
 
 class LandmarkerGroup(object):
-    def __init__(self, *landmarkers: Landmarker):
+    def __init__(self, *landmarkers: Landmarker, concurrent=False, combinePackets=False):
         self._landmarkers = landmarkers
+        self._lastTimestampMS = -1
+
+        # mediapipe 推理时会释放 GIL，多个 Landmarker 可以在线程池里同时处理一帧
+        self._executor = None
+        if concurrent and len(landmarkers) > 1:
+            self._executor = ThreadPoolExecutor(len(landmarkers), thread_name_prefix='Landmarker')
+
+        self._frameMerger = None
+        if combinePackets and len(landmarkers) > 0:
+            self._frameMerger = _FrameMerger(landmarkers[0]._server, len(landmarkers), sourceId=landmarkers[0].sourceId)
+
+            for l in landmarkers:
+                l._frameMerger = self._frameMerger
 
     def __enter__(self):
         return self
 
     def __exit__(self, *args, **kwargs):
-        self.stop()
+        self.close()
 
     def stop(self):
         for l in self._landmarkers:
             l.stop()
 
-    def detect(self, mpImage: mp.Image):
+        if self._frameMerger is not None:
+            self._frameMerger.reset()
+
+    def close(self):
+        self.stop()
+
         for l in self._landmarkers:
-            l.detect(mpImage)
+            l.close()
+
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def setLatencyListener(self, listener: typing.Callable[[Landmarker, float], None] | None):
+        for l in self._landmarkers:
+            l.setLatencyListener(listener)
+
+    def detect(self, img: np.ndarray, timestampMS: int | None = None):
+        # 所有 Landmarker 用同一个时间戳，这样才能按帧合并结果
+        if timestampMS is None:
+            timestampMS = _nextTimestampMS(self._lastTimestampMS)
+        self._lastTimestampMS = timestampMS
+
+        if self._executor is None:
+            for l in self._landmarkers:
+                l.detect(img, timestampMS)
+            return
+
+        futures = [self._executor.submit(l.detect, img, timestampMS) for l in self._landmarkers]
+
+        # 等所有 Landmarker 处理完这一帧。VIDEO 模式下下一帧的时间戳必须更大
+        for future in futures:
+            future.result()
 
     def drawLandmarks(self, img):
         for l in self._landmarkers:
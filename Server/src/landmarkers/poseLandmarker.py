@@ -1,6 +1,8 @@
 import mediapipe as mp
+import typing
 
-from landmarkers.landmarker import Landmarker
+from landmarkers.landmarker import Landmarker, fillLandmarkData
+from landmarkers.subjectTracker import Subjects
 from server import UDPServer
 from packet import Packet
 from protos.poseData_pb2 import PoseData
@@ -19,20 +21,43 @@ class PoseLandmarker(Landmarker):
         'landmark_drawing_connections': mp.solutions.pose.POSE_CONNECTIONS,
 
         # pose landmarker options
+        'num_poses': 1,
         'min_pose_detection_confidence': 0.8,
         'min_pose_presence_confidence': 0.8,
         'min_tracking_confidence': 0.8,
     }
 
-    def __init__(self, server: UDPServer, **kwargs):
+    def __init__(self, server: UDPServer, *, visibility_threshold=0.5, world_landmarks=True, **kwargs):
         super().__init__(server, **kwargs)
 
+        self._visibilityThreshold = visibility_threshold
+        self._worldLandmarks = world_landmarks
+
+    @property
+    def maxSubjectCount(self) -> int:
+        return self._landmarkerOptions.num_poses
+
     def _checkIsResultValid(self, result: PoseLandmarkerResult) -> bool:
         return len(result.pose_landmarks) > 0
 
-    def _createPacket(self, result: PoseLandmarkerResult, outputImage: mp.Image, timestampMS: int) -> Packet:
-        poseData = PoseData()
-        return Packet(PacketCode.POSE_DATA, poseData.SerializeToString())
+    def _createPackets(self, result: PoseLandmarkerResult, outputImage: mp.Image, timestampMS: int, subjects: Subjects) -> typing.Iterable[Packet]:
+        if not self._server.hasSubscribers(PacketCode.POSE_DATA):
+            return
+
+        # 每个人一个数据包
+        for i, landmarks in enumerate(result.pose_landmarks):
+            if subjects.ids[i] == 0:
+                continue
+
+            worldLandmarks = None
+            if self._worldLandmarks and i < len(result.pose_world_landmarks):
+                worldLandmarks = result.pose_world_landmarks[i]
+
+            poseData = PoseData()
+            poseData.subjectId = subjects.ids[i]
+            poseData.sourceId = self.sourceId
+            fillLandmarkData(poseData, landmarks, worldLandmarks, self._visibilityThreshold)
+            yield Packet(PacketCode.POSE_DATA, poseData.SerializeToString(), subjectId=poseData.subjectId)
 
-    def _getDrawingLandmarks(self, result: PoseLandmarkerResult):
-        return result.pose_landmarks[0]
+    def _getSubjectLandmarks(self, result: PoseLandmarkerResult):
+        return result.pose_landmarks
@@ -0,0 +1,118 @@
+import numpy as np
+import typing
+
+from cvutils import frameCopyStats
+
+class Roi(typing.NamedTuple):
+    # 裁剪区域在原图中的像素坐标
+    x: int
+    y: int
+    width: int
+    height: int
+    frameWidth: int
+    frameHeight: int
+
+class RoiTracker(object):
+    # 用上一帧的 landmark 框出下一帧的感兴趣区域，只把这部分送去推理
+    # 连续 maxMissedFrames 帧没有结果就退回到整帧
+    #
+    # mediapipe 在 VIDEO 和 LIVE_STREAM 模式下会用上一帧的 landmark 在内部跟踪，
+    # 裁剪区域一变，坐标就对不上了，会丢掉一帧。所以脸移动不多时不改变裁剪区域
+    def __init__(self, *, padding=0.5, minSize=160, maxMissedFrames=2, moveThreshold=0.1, resizeThreshold=0.15):
+        self._padding = padding
+        self._minSize = minSize
+        self._maxMissedFrames = maxMissedFrames
+        self._moveThreshold = moveThreshold
+        self._resizeThreshold = resizeThreshold
+
+        # 归一化的 (centerX, centerY, size)，size 相对于图像宽度。None 表示没有跟踪到
+        self._region = None
+        self._missedFrames = 0
+
+    @property
+    def isTracking(self) -> bool:
+        return self._region is not None
+
+    def reset(self):
+        self._region = None
+        self._missedFrames = 0
+
+    def crop(self, img: np.ndarray) -> tuple[np.ndarray, Roi | None]:
+        # 返回 (裁剪后的图像, Roi)。没有跟踪到时返回原图和 None
+        region = self._region
+
+        if region is None:
+            return img, None
+
+        frameHeight, frameWidth = img.shape[:2]
+        centerX, centerY, size = region
+
+        # 正方形区域，超出图像的部分截掉
+        size = min(max(round(size * frameWidth), self._minSize), frameWidth, frameHeight)
+        x = min(max(round(centerX * frameWidth - size / 2), 0), frameWidth - size)
+        y = min(max(round(centerY * frameHeight - size / 2), 0), frameHeight - size)
+
+        # 裁剪区域几乎是整帧时就不用复制了
+        if size * size * 2 > frameWidth * frameHeight:
+            return img, None
+
+        # mediapipe 要求数据是连续的
+        roiImg = np.ascontiguousarray(img[y:y+size, x:x+size])
+        frameCopyStats.addCopy(roiImg.nbytes)
+        return roiImg, Roi(x, y, size, size, frameWidth, frameHeight)
+
+    def restoreLandmarks(self, landmarks, roi: Roi | None):
+        # 把裁剪区域里的归一化坐标转换回原图的归一化坐标，直接修改 landmarks
+        if roi is None:
+            return
+
+        scaleX = roi.width / roi.frameWidth
+        scaleY = roi.height / roi.frameHeight
+        offsetX = roi.x / roi.frameWidth
+        offsetY = roi.y / roi.frameHeight
+
+        # z 和 x 使用相同的比例
+        for landmark in landmarks:
+            landmark.x = offsetX + landmark.x * scaleX
+            landmark.y = offsetY + landmark.y * scaleY
+            landmark.z = landmark.z * scaleX
+
+    def track(self, landmarks, frameWidth: int, frameHeight: int):
+        #! 在 Live Stream 模式下，这段代码在子线程执行
+        # landmarks 是原图的归一化坐标。传入 None 表示跟丢了
+        if landmarks is None or len(landmarks) == 0:
+            self._missedFrames += 1
+
+            if self._missedFrames > self._maxMissedFrames:
+                self._region = None
+            return
+
+        self._missedFrames = 0
+
+        points = np.array([(landmark.x, landmark.y) for landmark in landmarks], dtype=np.float32)
+        minX, minY = points.min(axis=0)
+        maxX, maxY = points.max(axis=0)
+
+        # 统一换算到以宽度为单位
+        aspect = frameHeight / frameWidth
+        size = float(max(maxX - minX, (maxY - minY) * aspect) * (1 + 2 * self._padding))
+        centerX = float(minX + maxX) / 2
+        centerY = float(minY + maxY) / 2
+
+        region = self._region
+        if region is not None:
+            lastCenterX, lastCenterY, lastSize = region
+
+            if all([
+                abs(centerX - lastCenterX) < lastSize * self._moveThreshold,
+                abs(centerY - lastCenterY) * aspect < lastSize * self._moveThreshold,
+                abs(size - lastSize) < lastSize * self._resizeThreshold,
+            ]):
+                return
+
+        self._region = (centerX, centerY, size) #! 赋值放在最后，保证线程安全
+
+def createRoiTracker(enable: bool, **params) -> RoiTracker | None:
+    if not enable:
+        return None
+    return RoiTracker(**params)
@@ -0,0 +1,129 @@
+import numpy as np
+import typing
+
+class Subjects(typing.NamedTuple):
+    # 一帧里每个检测结果对应的对象，顺序和 mediapipe 的结果一致
+    ids: list[int]
+    slots: np.ndarray
+
+    # 这一帧新出现的对象占用的槽位。槽位之前的对象留下的滤波器等状态需要重置
+    newSlots: list[int]
+
+def landmarkBoxes(landmarksList) -> np.ndarray:
+    # 返回形状为 (n, 4) 的包围盒 (minX, minY, maxX, maxY)，使用归一化坐标
+    boxes = np.empty((len(landmarksList), 4), dtype=np.float32)
+
+    for i, landmarks in enumerate(landmarksList):
+        points = np.array([(l.x, l.y) for l in landmarks], dtype=np.float32)
+        boxes[i, :2] = points.min(axis=0)
+        boxes[i, 2:] = points.max(axis=0)
+    return boxes
+
+def _iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # a: (n, 4), b: (m, 4) -> (n, m)
+    minXY = np.maximum(a[:, np.newaxis, :2], b[np.newaxis, :, :2])
+    maxXY = np.minimum(a[:, np.newaxis, 2:], b[np.newaxis, :, 2:])
+    intersection = np.prod(np.clip(maxXY - minXY, 0, None), axis=-1)
+
+    areaA = np.prod(a[:, 2:] - a[:, :2], axis=-1)
+    areaB = np.prod(b[:, 2:] - b[:, :2], axis=-1)
+    union = areaA[:, np.newaxis] + areaB[np.newaxis, :] - intersection
+    return intersection / np.maximum(union, 1e-9)
+
+def _centroidDistance(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # a: (n, 4), b: (m, 4) -> (n, m)
+    centerA = (a[:, :2] + a[:, 2:]) / 2
+    centerB = (b[:, :2] + b[:, 2:]) / 2
+    return np.linalg.norm(centerA[:, np.newaxis] - centerB[np.newaxis, :], axis=-1)
+
+def _greedyMatch(scores: np.ndarray, threshold: float, matches: dict):
+    # 每次取分数最高的一对，直到没有超过 threshold 的。matches: 检测结果下标 -> 槽位
+    scores = scores.copy()
+    scores[list(matches.keys()), :] = -np.inf
+    scores[:, list(matches.values())] = -np.inf
+
+    while scores.size > 0:
+        detection, slot = np.unravel_index(np.argmax(scores), scores.shape)
+
+        if scores[detection, slot] <= threshold:
+            break
+
+        matches[int(detection)] = int(slot)
+        scores[detection, :] = -np.inf
+        scores[:, slot] = -np.inf
+
+class SubjectTracker(object):
+    # 给每帧检测到的多个对象（脸、人、手）分配稳定的 ID
+    # 先按包围盒的 IoU 匹配上一帧的对象，IoU 太小的再按中心点的距离匹配，剩下的当作新对象
+    # 每个对象还占用一个 [0, slotCount) 的槽位，滤波器之类的状态按槽位保存
+    def __init__(self, slotCount: int, *, minIoU=0.3, maxCentroidDistance=0.1, maxMissedFrames=5):
+        self._slotCount = slotCount
+        self._minIoU = minIoU
+        self._maxCentroidDistance = maxCentroidDistance
+        self._maxMissedFrames = maxMissedFrames
+
+        # 每个槽位的对象。ID 为 0 表示空槽位
+        self._boxes = np.zeros((slotCount, 4), dtype=np.float32)
+        self._ids = np.zeros(slotCount, dtype=np.int64)
+        self._missedFrames = np.zeros(slotCount, dtype=np.int64)
+        self._nextId = 1
+
+    @property
+    def slotCount(self) -> int:
+        return self._slotCount
+
+    def reset(self):
+        self._ids[:] = 0
+        self._missedFrames[:] = 0
+
+    def track(self, boxes: np.ndarray) -> Subjects:
+        #! 在 Live Stream 模式下，这段代码在子线程执行
+        # boxes 是 landmarkBoxes 返回的包围盒。检测结果比槽位多时，多出来的结果得到的 ID 是 0
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        active = self._ids > 0
+        matches = {}
+
+        if len(boxes) > 0 and active.any():
+            iou = _iou(boxes, self._boxes)
+            iou[:, ~active] = -np.inf
+            _greedyMatch(iou, self._minIoU, matches)
+
+            distance = -_centroidDistance(boxes, self._boxes)
+            distance[:, ~active] = -np.inf
+            _greedyMatch(distance, -self._maxCentroidDistance, matches)
+
+        # 没有匹配上的槽位记一次丢失，太久没出现就释放
+        matched = np.zeros(self._slotCount, dtype=bool)
+        matched[list(matches.values())] = True
+        self._missedFrames[active & ~matched] += 1
+        self._ids[self._missedFrames > self._maxMissedFrames] = 0
+
+        newSlots = []
+        freeSlots = [int(s) for s in np.flatnonzero(self._ids == 0)]
+
+        for detection in range(len(boxes)):
+            if detection in matches or len(freeSlots) == 0:
+                continue
+
+            slot = freeSlots.pop(0)
+            self._ids[slot] = self._nextId
+            self._nextId += 1
+            matches[detection] = slot
+            newSlots.append(slot)
+
+        ids = []
+        slots = np.zeros(len(boxes), dtype=np.intp)
+
+        for detection in range(len(boxes)):
+            slot = matches.get(detection, None)
+
+            if slot is None:
+                ids.append(0)
+                continue
+
+            self._boxes[slot] = boxes[detection]
+            self._missedFrames[slot] = 0
+            slots[detection] = slot
+            ids.append(int(self._ids[slot]))
+
+        return Subjects(ids, slots, newSlots)
@@ -10,45 +10,124 @@ def main():
 
     import time
     import cv2
-    import mediapipe as mp
     import config
     import cvutils
+    import governor as gv
     import handlers
+    import metrics as mt
+    import pipeline as pl
     import server as sv
 
-    capture = cvutils.LazyLiveCapture(**config.CAPTURE_CONFIG)
+    captureConfigs = config.getCaptureConfigs()
+
+    if len(captureConfigs) > 1:
+        _runSources(captureConfigs)
+        return
+
+    capture = cvutils.LazyLiveCapture(**captureConfigs[0])
     window = cvutils.LazyLiveWindow(**config.WINDOW_CONFIG)
     server = sv.UDPServer(**config.SERVER_CONFIG)
     landmarker = config.getLandmarker(server)
+    governor = gv.AdaptiveGovernor(**config.GOVERNOR_CONFIG)
+    pipeline = pl.FramePipeline(capture, landmarker, governor, **config.PIPELINE_CONFIG)
+    recorder = _createRecorder(config.RECORD_CONFIG)
+    metricsReporter = mt.MetricsReporter(**config.METRICS_CONFIG)
+    displayStats = mt.metrics.stage('main.display')
 
     try:
+        server.setRecorder(recorder)
         server.start()
+        metricsReporter.start()
 
         while True:
             server.tick()
+            metricsReporter.tick()
 
             if server.clientCount <= 0:
+                pipeline.stop()
                 capture.release()
                 window.close()
                 landmarker.stop()
                 time.sleep(1)
                 continue
 
-            success, img = capture.read()
-            if not success:
+            # 采集和推理在子线程进行，主线程只负责显示
+            pipeline.start()
+            img = pipeline.getDisplayFrame(timeout=0.1)
+
+            if pipeline.failed:
                 exit(-1)
 
-            landmarker.detect(mp.Image(image_format=mp.ImageFormat.SRGB, data=img))
-            landmarker.drawLandmarks(img)
-            window.showImage(img)
+            if img is not None:
+                startNS = time.perf_counter_ns()
+                window.showImage(img, landmarker.drawLandmarks)
+                displayStats.since(startNS)
 
             if (cv2.waitKey(1) & 0xFF) == ord('q'):
                 exit()
     finally:
+        pipeline.stop()
         capture.release()
         window.close()
-        landmarker.stop()
+        landmarker.close()
         server.close()
+        metricsReporter.close()
+
+        if recorder is not None:
+            recorder.close()
+            print(f'Saved {recorder.recordCount} packets.')
+
+def _runSources(captureConfigs: list[dict]):
+    # 多个采集源：每个源在自己的工作进程里采集、推理和显示，主进程只负责收发数据包
+    import time
+    import config
+    import handlers
+    import metrics as mt
+    import server as sv
+
+    from sourceWorker import SourceWorkerPool
+
+    server = sv.UDPServer(**config.SERVER_CONFIG)
+    sources = SourceWorkerPool(server, captureConfigs, **config.SOURCE_WORKER_CONFIG)
+    recorder = _createRecorder(config.RECORD_CONFIG)
+    metricsReporter = mt.MetricsReporter(**config.METRICS_CONFIG)
+
+    try:
+        server.setRecorder(recorder)
+        server.start()
+        sources.start()
+        metricsReporter.start()
+
+        while True:
+            server.tick()
+            sources.tick()
+            metricsReporter.tick()
+
+            exitCode = sources.exitCode
+            if exitCode is not None:
+                exit(exitCode)
+
+            time.sleep(0.1 if server.clientCount > 0 else 1)
+    finally:
+        sources.close()
+        server.close()
+        metricsReporter.close()
+
+        if recorder is not None:
+            recorder.close()
+            print(f'Saved {recorder.recordCount} packets.')
+
+def _createRecorder(recordConfig: dict):
+    if not recordConfig['enable']:
+        return None
+
+    import time
+    from motionFile import MotionFileWriter
+
+    os.makedirs(recordConfig['folder'], exist_ok=True)
+    path = os.path.join(recordConfig['folder'], time.strftime('%Y%m%d-%H%M%S') + '.motion')
+    print(f'Recording to \'{path}\'...')
+    return MotionFileWriter(path, chunkSize=recordConfig['chunkSize'])
 
 if __name__ == '__main__':
     main()
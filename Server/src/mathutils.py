@@ -0,0 +1,57 @@
+import numpy as np
+
+# 1 + m00 + m11 + m22, 1 + m00 - m11 - m22, 1 - m00 + m11 - m22, 1 - m00 - m11 + m22
+_QUATERNION_DIAGONAL_SIGNS = np.array([
+    [ 1,  1,  1],
+    [ 1, -1, -1],
+    [-1,  1, -1],
+    [-1, -1,  1],
+], dtype=np.float32)
+
+# Unity 是左手系。Y 轴向上，Z 轴向前，X 轴向右
+# mediapipe 是右手系。Y 轴向上，Z 轴向前，X 轴向左
+# 两者只差一个 X 轴的镜像
+_UNITY_QUATERNION_SIGNS = np.array([1, 1, -1, -1], dtype=np.float32) # w, x, y, z
+_UNITY_VECTOR_SIGNS = np.array([-1, 1, 1], dtype=np.float32) # x, y, z
+
+# mediapipe 的 landmark 和图像坐标一致，X 轴向右，Y 轴向下，Z 轴向前（离相机越远越大），是右手系
+# 转换到 Unity 只需要翻转 Y 轴。归一化坐标再往上平移 1，原点变成图像左下角
+_UNITY_LANDMARK_SIGNS = np.array([1, -1, 1], dtype=np.float32) # x, y, z
+_UNITY_NORMALIZED_LANDMARK_OFFSETS = np.array([0, 1, 0], dtype=np.float32) # x, y, z
+
+def matrixToQuaternions(matrices: np.ndarray) -> np.ndarray:
+    # matrices 的形状是 (..., 3, 3) 或 (..., 4, 4)，返回形状为 (..., 4) 的 (w, x, y, z)
+    # 不会修改 matrices
+    m = np.asarray(matrices)[..., :3, :3]
+
+    # 去掉缩放
+    m = m / np.linalg.norm(m, axis=-2, keepdims=True)
+
+    diagonal = np.diagonal(m, axis1=-2, axis2=-1)
+    q = 1 + diagonal @ _QUATERNION_DIAGONAL_SIGNS.T
+    np.maximum(q, 0, out=q)
+    np.sqrt(q, out=q)
+    q *= 0.5
+
+    np.copysign(q[..., 1], m[..., 2, 1] - m[..., 1, 2], out=q[..., 1])
+    np.copysign(q[..., 2], m[..., 0, 2] - m[..., 2, 0], out=q[..., 2])
+    np.copysign(q[..., 3], m[..., 1, 0] - m[..., 0, 1], out=q[..., 3])
+    return q
+
+def toUnityQuaternions(quaternions: np.ndarray) -> np.ndarray:
+    # mediapipe (w, x, y, z) -> Unity (w, x, y, z)
+    # rotation.w == cos(theta/2) 偶函数，不用管
+    return np.asarray(quaternions) * _UNITY_QUATERNION_SIGNS
+
+def toUnityVectors(vectors: np.ndarray) -> np.ndarray:
+    # mediapipe (x, y, z) -> Unity (x, y, z)
+    return np.asarray(vectors) * _UNITY_VECTOR_SIGNS
+
+def toUnityLandmarks(landmarks: np.ndarray, normalized: bool) -> np.ndarray:
+    # landmarks 是形状为 (..., 3) 的 float32 数组，mediapipe landmark (x, y, z) -> Unity (x, y, z)
+    # 直接修改并返回 landmarks
+    landmarks *= _UNITY_LANDMARK_SIGNS
+
+    if normalized:
+        landmarks += _UNITY_NORMALIZED_LANDMARK_OFFSETS
+    return landmarks
@@ -0,0 +1,243 @@
+import json
+import threading
+import time
+
+import numpy as np
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StageStats(object):
+    # 记录一个阶段最近 sampleCount 次的耗时（纳秒），固定大小的环形缓冲区
+    def __init__(self, name: str, sampleCount: int):
+        self._name = name
+        self._samples = np.zeros(sampleCount, dtype=np.int64)
+        self._index = 0
+        self._totalCount = 0
+        self._lock = threading.Lock()
+        self.enabled = True
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def record(self, durationNS: int):
+        if not self.enabled:
+            return
+
+        self._lock.acquire()
+        try:
+            self._samples[self._index] = durationNS
+            self._index = (self._index + 1) % len(self._samples)
+            self._totalCount += 1
+        finally:
+            self._lock.release()
+
+    def since(self, startNS: int):
+        # startNS 来自 time.perf_counter_ns()
+        self.record(time.perf_counter_ns() - startNS)
+
+    def snapshot(self) -> dict:
+        self._lock.acquire()
+        try:
+            totalCount = self._totalCount
+            samples = self._samples[:min(totalCount, len(self._samples))].copy()
+        finally:
+            self._lock.release()
+
+        if len(samples) == 0:
+            return { 'count': 0 }
+
+        p50, p95, p99 = (np.percentile(samples, (50, 95, 99)) / 1e6).tolist()
+        return {
+            'count': totalCount,
+            'p50Ms': round(p50, 3),
+            'p95Ms': round(p95, 3),
+            'p99Ms': round(p99, 3),
+            'maxMs': round(float(samples.max()) / 1e6, 3),
+        }
+
+class Metrics(object):
+    def __init__(self, sampleCount=1024):
+        self._sampleCount = sampleCount
+        self._stages = {}
+        self._clientTraffic = {} # client -> [packets, bytes]
+        self._clientTimings = {} # client -> dict
+        self._enabled = True
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value: bool):
+        # 关闭以后所有记录都直接返回，已经缓存起来的 StageStats 也一样
+        self._lock.acquire()
+        try:
+            self._enabled = value
+            for stats in self._stages.values():
+                stats.enabled = value
+        finally:
+            self._lock.release()
+
+    def stage(self, name: str) -> StageStats:
+        # 热路径上最好把返回值缓存起来
+        stats = self._stages.get(name, None)
+
+        if stats is not None:
+            return stats
+
+        self._lock.acquire()
+        try:
+            stats = self._stages.get(name, None)
+
+            if stats is None:
+                stats = StageStats(name, self._sampleCount)
+                stats.enabled = self._enabled
+                self._stages[name] = stats
+            return stats
+        finally:
+            self._lock.release()
+
+    def recordSend(self, clientAddrs, nbytes: int):
+        if not self._enabled:
+            return
+
+        self._lock.acquire()
+        try:
+            for clientAddr in clientAddrs:
+                traffic = self._clientTraffic.get(clientAddr, None)
+
+                if traffic is None:
+                    traffic = [0, 0]
+                    self._clientTraffic[clientAddr] = traffic
+
+                traffic[0] += 1
+                traffic[1] += nbytes
+        finally:
+            self._lock.release()
+
+    def setClientTiming(self, clientAddr, *, rttMS: float | None, lossRate: float | None, captureToSendMS: float | None):
+        if not self._enabled:
+            return
+
+        timing = {
+            'rttMs': None if rttMS is None else round(rttMS, 2),
+            'lossRate': None if lossRate is None else round(lossRate, 3),
+            'captureToSendMs': None if captureToSendMS is None else round(captureToSendMS, 2),
+        }
+
+        self._lock.acquire()
+        try:
+            self._clientTimings[clientAddr] = timing
+        finally:
+            self._lock.release()
+
+    def forgetClient(self, clientAddr):
+        self._lock.acquire()
+        try:
+            self._clientTraffic.pop(clientAddr, None)
+            self._clientTimings.pop(clientAddr, None)
+        finally:
+            self._lock.release()
+
+    def snapshot(self) -> dict:
+        self._lock.acquire()
+        try:
+            stages = list(self._stages.values())
+            clients = {}
+
+            for addr, (packets, nbytes) in self._clientTraffic.items():
+                clients[f'{addr[0]}:{addr[1]}'] = { 'packets': packets, 'bytes': nbytes, **self._clientTimings.get(addr, {}) }
+        finally:
+            self._lock.release()
+
+        return {
+            'stages': { s.name: s.snapshot() for s in sorted(stages, key=lambda s: s.name) },
+            'clients': clients,
+        }
+
+    def formatLine(self) -> str:
+        snapshot = self.snapshot()
+        items = []
+
+        for name, stats in snapshot['stages'].items():
+            if stats['count'] > 0:
+                items.append(f'{name} p50={stats["p50Ms"]:.2f}ms p99={stats["p99Ms"]:.2f}ms')
+
+        for addr, client in snapshot['clients'].items():
+            item = f'{addr} {client["packets"]} packets {client["bytes"] / 1024:.1f} KiB'
+
+            if client.get('rttMs', None) is not None:
+                item += f' rtt={client["rttMs"]:.1f}ms'
+            if client.get('lossRate', None) is not None:
+                item += f' loss={client["lossRate"] * 100:.0f}%'
+            if client.get('captureToSendMs', None) is not None:
+                item += f' latency={client["captureToSendMs"]:.1f}ms'
+
+            items.append(item)
+
+        return ' | '.join(items)
+
+# 全局的统计数据
+metrics = Metrics()
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') != '/metrics':
+            self.send_error(404)
+            return
+
+        body = json.dumps(metrics.snapshot()).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 不要每个请求都打印一行
+        pass
+
+class MetricsReporter(object):
+    # 定期打印统计数据，并且在 http://127.0.0.1:<httpPort>/metrics 提供 JSON 格式的数据
+    # enable 为 False 时全局的 metrics 也不再记录，热路径上的统计都变成空操作
+    def __init__(self, *, enable=True, logIntervalSecs=10.0, httpPort: int | None = None):
+        self._enable = enable
+        metrics.enabled = enable
+        self._logIntervalSecs = logIntervalSecs
+        self._httpPort = httpPort
+        self._lastLogTime = time.monotonic()
+        self._httpServer = None
+
+    def start(self):
+        if not self._enable or self._httpPort is None or self._httpServer is not None:
+            return
+
+        # 只监听本机
+        self._httpServer = ThreadingHTTPServer(('127.0.0.1', self._httpPort), _MetricsRequestHandler)
+        self._httpServer.daemon_threads = True
+        threading.Thread(target=self._httpServer.serve_forever, name='Metrics', daemon=True).start()
+        print(f'Metrics are available at http://127.0.0.1:{self._httpPort}/metrics')
+
+    def tick(self):
+        if not self._enable or self._logIntervalSecs is None:
+            return
+
+        now = time.monotonic()
+        if now - self._lastLogTime < self._logIntervalSecs:
+            return
+
+        self._lastLogTime = now
+        line = metrics.formatLine()
+
+        if line:
+            print(f'Metrics: {line}')
+
+    def close(self):
+        if self._httpServer is None:
+            return
+
+        self._httpServer.shutdown()
+        self._httpServer.server_close()
+        self._httpServer = None
@@ -0,0 +1,303 @@
+import bisect
+import mmap
+import struct
+import threading
+import time
+import typing
+
+from packet import Packet
+from protos.packetCode_pb2 import PacketCode
+
+MOTION_FILE_MAGIC = b'SRMC'
+MOTION_FILE_VERSION = 2
+
+_CHUNK_MAGIC = b'CHNK'
+_INDEX_MAGIC = b'SRMI'
+
+# 文件格式（小端序）:
+#   文件头
+#   块 0: 块头 + 记录 + 记录 + ...
+#   块 1: ...
+#   索引: 每个块一项
+#   索引尾
+# 文件只会在末尾追加数据。没有正常关闭的文件没有索引，读取时会顺序扫描块头重建索引
+
+# magic, version
+_FILE_HEADER_STRUCT = struct.Struct('<4sH')
+# magic, recordCount, recordsSize, firstTimestampMS, lastTimestampMS
+_CHUNK_HEADER_STRUCT = struct.Struct('<4sIIqq')
+# timestampMS, PacketCode, payloadLength
+_RECORD_HEADER_STRUCT = struct.Struct('<qHI')
+# chunkOffset, recordCount, firstTimestampMS, lastTimestampMS
+_INDEX_ENTRY_STRUCT = struct.Struct('<QIqq')
+# indexOffset, chunkCount, magic
+_INDEX_TRAILER_STRUCT = struct.Struct('<QI4s')
+
+class _ChunkInfo(typing.NamedTuple):
+    offset: int
+    recordCount: int
+    firstTimestampMS: int
+    lastTimestampMS: int
+
+class MotionFileWriter(object):
+    # 按时间顺序记录数据包。可以在多个线程里调用 write
+    def __init__(self, path: str, *, chunkSize: int = 64 * 1024):
+        self._file = open(path, 'wb')
+        self._file.write(_FILE_HEADER_STRUCT.pack(MOTION_FILE_MAGIC, MOTION_FILE_VERSION))
+        self._chunkSize = chunkSize
+        self._lock = threading.Lock()
+
+        self._chunks = []
+        self._chunkBuffer = bytearray()
+        self._chunkRecordCount = 0
+        self._chunkFirstTimestampMS = 0
+        self._lastTimestampMS = 0
+        self._recordCount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    @property
+    def recordCount(self) -> int:
+        return self._recordCount
+
+    def write(self, timestampMS: int, packet: Packet):
+        payloadBytes = packet.payloadBytes or b''
+
+        self._lock.acquire()
+        try:
+            if self._file is None:
+                return
+
+            # 保证时间戳不递减，否则没法二分查找
+            timestampMS = max(timestampMS, self._lastTimestampMS)
+            self._lastTimestampMS = timestampMS
+
+            if self._chunkRecordCount == 0:
+                self._chunkFirstTimestampMS = timestampMS
+
+            self._chunkBuffer += _RECORD_HEADER_STRUCT.pack(timestampMS, packet.packetCode, len(payloadBytes))
+            self._chunkBuffer += payloadBytes
+            self._chunkRecordCount += 1
+            self._recordCount += 1
+
+            if len(self._chunkBuffer) >= self._chunkSize:
+                self._flushChunk()
+        finally:
+            self._lock.release()
+
+    def _flushChunk(self):
+        if self._chunkRecordCount == 0:
+            return
+
+        chunk = _ChunkInfo(self._file.tell(), self._chunkRecordCount, self._chunkFirstTimestampMS, self._lastTimestampMS)
+        self._file.write(_CHUNK_HEADER_STRUCT.pack(_CHUNK_MAGIC, chunk.recordCount, len(self._chunkBuffer),
+                                                   chunk.firstTimestampMS, chunk.lastTimestampMS))
+        self._file.write(self._chunkBuffer)
+        self._file.flush()
+        self._chunks.append(chunk)
+
+        self._chunkBuffer.clear()
+        self._chunkRecordCount = 0
+
+    def close(self):
+        self._lock.acquire()
+        try:
+            if self._file is None:
+                return
+
+            self._flushChunk()
+
+            indexOffset = self._file.tell()
+            for chunk in self._chunks:
+                self._file.write(_INDEX_ENTRY_STRUCT.pack(chunk.offset, chunk.recordCount, chunk.firstTimestampMS, chunk.lastTimestampMS))
+            self._file.write(_INDEX_TRAILER_STRUCT.pack(indexOffset, len(self._chunks), _INDEX_MAGIC))
+
+            self._file.close()
+            self._file = None
+        finally:
+            self._lock.release()
+
+class MotionFileReader(object):
+    # 用 mmap 读取，返回的 payload 都是 memoryview，不会复制数据
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f'\'{path}\' is empty!')
+
+        self._view = memoryview(self._mmap)
+
+        if len(self._view) < _FILE_HEADER_STRUCT.size:
+            self.close()
+            raise ValueError(f'\'{path}\' is not a motion file!')
+
+        magic, version = _FILE_HEADER_STRUCT.unpack_from(self._view, 0)
+        if magic != MOTION_FILE_MAGIC or version != MOTION_FILE_VERSION:
+            self.close()
+            raise ValueError(f'\'{path}\' is not a motion file (version {MOTION_FILE_VERSION})!')
+
+        self._chunks = self._readIndex() or self._scanChunks()
+        self._chunkFirstTimestamps = [chunk.firstTimestampMS for chunk in self._chunks]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    def _readIndex(self) -> list:
+        size = len(self._view)
+
+        if size < _FILE_HEADER_STRUCT.size + _INDEX_TRAILER_STRUCT.size:
+            return []
+
+        indexOffset, chunkCount, magic = _INDEX_TRAILER_STRUCT.unpack_from(self._view, size - _INDEX_TRAILER_STRUCT.size)
+        if magic != _INDEX_MAGIC or indexOffset + chunkCount * _INDEX_ENTRY_STRUCT.size + _INDEX_TRAILER_STRUCT.size != size:
+            return []
+
+        return [_ChunkInfo(*entry) for entry in _INDEX_ENTRY_STRUCT.iter_unpack(self._view[indexOffset:size-_INDEX_TRAILER_STRUCT.size])]
+
+    def _scanChunks(self) -> list:
+        chunks = []
+        offset = _FILE_HEADER_STRUCT.size
+        size = len(self._view)
+
+        while offset + _CHUNK_HEADER_STRUCT.size <= size:
+            magic, recordCount, recordsSize, firstTimestampMS, lastTimestampMS = _CHUNK_HEADER_STRUCT.unpack_from(self._view, offset)
+
+            # 最后一块可能没写完
+            if magic != _CHUNK_MAGIC or offset + _CHUNK_HEADER_STRUCT.size + recordsSize > size:
+                break
+
+            chunks.append(_ChunkInfo(offset, recordCount, firstTimestampMS, lastTimestampMS))
+            offset += _CHUNK_HEADER_STRUCT.size + recordsSize
+        return chunks
+
+    @property
+    def recordCount(self) -> int:
+        return sum(chunk.recordCount for chunk in self._chunks)
+
+    @property
+    def startTimestampMS(self) -> int:
+        return self._chunks[0].firstTimestampMS if self._chunks else 0
+
+    @property
+    def endTimestampMS(self) -> int:
+        return self._chunks[-1].lastTimestampMS if self._chunks else 0
+
+    def records(self, startTimestampMS: int | None = None) -> typing.Iterator[tuple[int, PacketCode, memoryview]]:
+        # 从 startTimestampMS 开始按顺序返回 (timestampMS, PacketCode, payload)
+        # 先二分查找所在的块，再在块内顺序查找
+        chunkIndex = 0
+        if startTimestampMS is not None:
+            chunkIndex = max(0, bisect.bisect_right(self._chunkFirstTimestamps, startTimestampMS) - 1)
+
+        for chunk in self._chunks[chunkIndex:]:
+            offset = chunk.offset + _CHUNK_HEADER_STRUCT.size
+
+            for _ in range(chunk.recordCount):
+                timestampMS, packetCode, payloadLength = _RECORD_HEADER_STRUCT.unpack_from(self._view, offset)
+                offset += _RECORD_HEADER_STRUCT.size
+
+                if startTimestampMS is None or timestampMS >= startTimestampMS:
+                    yield timestampMS, packetCode, self._view[offset:offset+payloadLength]
+
+                offset += payloadLength
+
+    def close(self):
+        if self._mmap is None:
+            return
+
+        self._view.release()
+
+        try:
+            self._mmap.close()
+        except BufferError:
+            # 还有 payload 的 memoryview 没有释放，等它们被回收后 mmap 会自动关闭
+            pass
+
+        self._mmap = None
+        self._file.close()
+
+class MotionPlayer(object):
+    # 按照原来的速度（或者乘上 speed）通过 UDPServer 重放记录的数据包
+    # 只要求 server 有 send(packet) 方法
+    _SKIPPED_PACKET_CODES = frozenset([
+        # 只在握手时单独发送
+        PacketCode.FACE_SCHEMA_RSP,
+        # 录制结束时服务器关闭发出的
+        PacketCode.QUIT_NOTIFY,
+        # 旧的录制文件里会有广播的 PING，重放时它们早就过期了
+        PacketCode.PING,
+    ])
+
+    def __init__(self, reader: MotionFileReader, server, *, speed: float = 1.0, loop: bool = False):
+        self._reader = reader
+        self._server = server
+        self._speed = speed
+        self._loop = loop
+
+        self._stopEvent = threading.Event()
+        self._finishedEvent = threading.Event()
+        self._thread = None
+
+    @property
+    def isPlaying(self) -> bool:
+        return self._thread is not None and not self._finishedEvent.is_set()
+
+    @property
+    def finished(self) -> bool:
+        return self._finishedEvent.is_set()
+
+    def start(self, startTimestampMS: int | None = None):
+        if self._thread is not None:
+            return
+
+        self._stopEvent.clear()
+        self._finishedEvent.clear()
+        self._thread = threading.Thread(target=self._play, args=(startTimestampMS,), name='Playback', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        self._stopEvent.set()
+        self._thread.join()
+        self._thread = None
+
+        # 被中途停止的不算播放完
+        self._finishedEvent.clear()
+
+    def _play(self, startTimestampMS: int | None):
+        try:
+            while not self._stopEvent.is_set():
+                startTime = time.monotonic()
+                baseTimestampMS = None
+
+                for timestampMS, packetCode, payloadBytes in self._reader.records(startTimestampMS):
+                    if packetCode in self._SKIPPED_PACKET_CODES:
+                        continue
+
+                    if baseTimestampMS is None:
+                        baseTimestampMS = timestampMS
+
+                    waitSecs = startTime + (timestampMS - baseTimestampMS) / 1000 / self._speed - time.monotonic()
+                    if waitSecs > 0 and self._stopEvent.wait(waitSecs):
+                        return
+
+                    self._server.send(Packet(packetCode, payloadBytes))
+
+                if not self._loop:
+                    return
+
+                startTimestampMS = None
+        finally:
+            self._finishedEvent.set()
@@ -0,0 +1,162 @@
+import ctypes
+import ctypes.util
+import socket
+import sys
+import threading
+
+class _SockAddrIn(ctypes.Structure):
+    _fields_ = [
+        ('sin_family', ctypes.c_ushort),
+        ('sin_port', ctypes.c_uint16), # network byte order
+        ('sin_addr', ctypes.c_uint8 * 4),
+        ('sin_zero', ctypes.c_uint8 * 8),
+    ]
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [
+        ('iov_base', ctypes.c_void_p),
+        ('iov_len', ctypes.c_size_t),
+    ]
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_name', ctypes.c_void_p),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.POINTER(_IOVec)),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_void_p),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int),
+    ]
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_hdr', _MsgHdr),
+        ('msg_len', ctypes.c_uint),
+    ]
+
+def _loadSendMMsg():
+    if not sys.platform.startswith('linux'):
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        func = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None
+
+    func.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    func.restype = ctypes.c_int
+    return func
+
+_sendmmsg = _loadSendMMsg()
+_MMSGHDR_SIZE = ctypes.sizeof(_MMsgHdr)
+
+HAS_SENDMMSG = _sendmmsg is not None
+
+class BatchSender(object):
+    # 把同一份数据发给多个地址。Linux 上用一次 sendmmsg 系统调用发完，其他平台逐个 sendto
+    def __init__(self, sock: socket.socket, *, useSendMMsg=True):
+        self._sock = sock
+        self._useSendMMsg = useSendMMsg and HAS_SENDMMSG and sock.family == socket.AF_INET
+        self._sockAddrs = {}
+
+        self._lock = threading.Lock()
+        self._iov = _IOVec()
+        self._preparedAddrs = None
+        self._preparedSockAddrs = None
+        self._preparedMsgs = None
+
+    def _getSockAddr(self, addr) -> _SockAddrIn | None:
+        sockAddr = self._sockAddrs.get(addr, None)
+
+        if sockAddr is None:
+            try:
+                host, port = addr
+                sockAddr = _SockAddrIn()
+                sockAddr.sin_family = socket.AF_INET
+                sockAddr.sin_port = socket.htons(port)
+                sockAddr.sin_addr[:] = socket.inet_aton(host)
+            except (OSError, TypeError, ValueError):
+                return None
+            self._sockAddrs[addr] = sockAddr
+        return sockAddr
+
+    def forget(self, addr):
+        with self._lock:
+            self._sockAddrs.pop(addr, None)
+
+            if self._preparedAddrs is not None and addr in self._preparedAddrs:
+                self._preparedAddrs = None
+                self._preparedSockAddrs = None
+                self._preparedMsgs = None
+
+    def _prepareMessages(self, addrs: tuple) -> bool:
+        # 客户端列表很少变化，缓存 mmsghdr 数组，每次只需要改 iovec
+        if self._preparedAddrs == addrs:
+            return True
+
+        sockAddrs = [self._getSockAddr(addr) for addr in addrs]
+
+        if None in sockAddrs:
+            return False
+
+        msgs = (_MMsgHdr * len(addrs))()
+        iovPtr = ctypes.pointer(self._iov)
+
+        for msg, sockAddr in zip(msgs, sockAddrs):
+            msg.msg_hdr.msg_name = ctypes.addressof(sockAddr)
+            msg.msg_hdr.msg_namelen = ctypes.sizeof(_SockAddrIn)
+            msg.msg_hdr.msg_iov = iovPtr
+            msg.msg_hdr.msg_iovlen = 1
+
+        self._preparedAddrs = addrs
+        self._preparedSockAddrs = sockAddrs # 保证 sockaddr 的生命周期
+        self._preparedMsgs = msgs
+        return True
+
+    def sendTo(self, data: bytes | bytearray | memoryview, addrs: list) -> None:
+        if len(addrs) == 0:
+            return
+
+        if not self._useSendMMsg or len(addrs) == 1:
+            self._sendToEach(data, addrs)
+            return
+
+        view = memoryview(data)
+        if view.readonly:
+            view = memoryview(bytearray(view))
+
+        addrs = tuple(addrs)
+
+        with self._lock:
+            if not self._prepareMessages(addrs):
+                self._sendToEach(view, addrs)
+                return
+
+            # 所有消息共用同一个 iovec，数据不会被复制
+            dataBuffer = (ctypes.c_char * view.nbytes).from_buffer(view)
+            self._iov.iov_base = ctypes.addressof(dataBuffer)
+            self._iov.iov_len = view.nbytes
+
+            fd = self._sock.fileno()
+            msgsAddr = ctypes.addressof(self._preparedMsgs)
+            sentCount = 0
+
+            try:
+                while sentCount < len(addrs):
+                    result = _sendmmsg(fd, msgsAddr + sentCount * _MMSGHDR_SIZE, len(addrs) - sentCount, 0)
+
+                    if result <= 0:
+                        # 出错了就逐个发送剩下的，让 sendto 抛出异常
+                        self._sendToEach(view, addrs[sentCount:])
+                        return
+
+                    sentCount += result
+            finally:
+                self._iov.iov_base = None
+                del dataBuffer
+
+    def _sendToEach(self, data, addrs: list) -> None:
+        for addr in addrs:
+            self._sock.sendto(data, addr)
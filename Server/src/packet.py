@@ -1,3 +1,4 @@
+import struct
 import typing
 
 from protos.packetCode_pb2 import PacketCode
@@ -5,54 +6,163 @@ from protos.packetCode_pb2 import PacketCode
 PACKET_CONST_HEAD = 0x2B3C
 PACKET_CONST_TAIL = 0x4D5F
 
-def _readUInt16(data: bytes, startIndex: int) -> int:
-    b1 = data[startIndex]
-    b2 = data[startIndex + 1]
-    return (b1 << 8) | b2
+# 扩展包头，多了帧的采集时间戳和序号。只发给发送过 TIMING_REQ 的客户端
+PACKET_CONST_HEAD_EXT = 0x2B3D
 
-def _writeUInt16(buffer: bytearray, value: int) -> None:
-    buffer.append((value >> 8) & 0xFF)
-    buffer.append(value & 0xFF)
+# CONST_HEAD + PacketCode + PayloadLength
+_HEAD_STRUCT = struct.Struct('>HHH')
+# CONST_HEAD_EXT + PacketCode + PayloadLength + TimestampMS + Sequence
+_HEAD_EXT_STRUCT = struct.Struct('>HHHqI')
+# CONST_TAIL
+_TAIL_STRUCT = struct.Struct('>H')
+
+_HEAD_SIZE = _HEAD_STRUCT.size
+_HEAD_EXT_SIZE = _HEAD_EXT_STRUCT.size
+_TAIL_SIZE = _TAIL_STRUCT.size
+_TAIL_BYTES = _TAIL_STRUCT.pack(PACKET_CONST_TAIL)
+_packHead = _HEAD_STRUCT.pack_into
+_packHeadExt = _HEAD_EXT_STRUCT.pack_into
+_packTail = _TAIL_STRUCT.pack_into
+_unpackHead = _HEAD_STRUCT.unpack_from
+_unpackHeadExt = _HEAD_EXT_STRUCT.unpack_from
+_unpackTail = _TAIL_STRUCT.unpack_from
+
+# sizeof(CONST_HEAD + PacketCode + PayloadLength + CONST_TAIL) == 8
+PACKET_OVERHEAD_SIZE = _HEAD_STRUCT.size + _TAIL_STRUCT.size
+# sizeof(CONST_HEAD_EXT + PacketCode + PayloadLength + TimestampMS + Sequence + CONST_TAIL) == 20
+PACKET_EXT_OVERHEAD_SIZE = _HEAD_EXT_STRUCT.size + _TAIL_STRUCT.size
+PACKET_MAX_PAYLOAD_SIZE = 0xFFFF
+
+_SEQUENCE_MASK = 0xFFFFFFFF
 
 class Packet(object):
-    def __init__(self, packetCode: PacketCode, payloadBytes: bytes | bytearray | None = None) -> None:
+    # 每收发一个包都要创建一个实例，用 __slots__ 让创建更快
+    __slots__ = ('packetCode', 'payloadBytes', 'timestampMS', 'sequence', 'subjectId', 'sourceId')
+
+    def __init__(self, packetCode: PacketCode, payloadBytes: bytes | bytearray | memoryview | None = None,
+                 timestampMS: int | None = None, sequence: int = 0, *, subjectId: int = 0, sourceId: int = 0) -> None:
         self.packetCode = packetCode
         self.payloadBytes = payloadBytes
 
-    def encode(self) -> bytearray:
-        buffer = bytearray()
-        _writeUInt16(buffer, PACKET_CONST_HEAD)
-        _writeUInt16(buffer, self.packetCode)
+        # 数据来自的那一帧的采集时间（time.monotonic 的毫秒）和序号，只在扩展包头里发送
+        self.timestampMS = timestampMS
+        self.sequence = sequence
+
+        # 数据属于哪个对象（脸、人、手），0 表示不属于某个对象。不在包头里发送，只用来按客户端的订阅过滤
+        self.subjectId = subjectId
+
+        # 数据来自哪个采集源，同样不在包头里发送
+        self.sourceId = sourceId
+
+    @property
+    def hasTimestamp(self) -> bool:
+        return self.timestampMS is not None
+
+    @property
+    def size(self) -> int:
+        return self.encodedSize()
+
+    def encodedSize(self, extended: bool = False) -> int:
+        payloadBytes = self.payloadBytes
+        payloadSize = 0 if payloadBytes is None else len(payloadBytes)
+
+        if extended and self.timestampMS is not None:
+            return PACKET_EXT_OVERHEAD_SIZE + payloadSize
+        return PACKET_OVERHEAD_SIZE + payloadSize
+
+    def encodeInto(self, buffer: bytearray | memoryview, offset: int = 0, *, extended: bool = False) -> int:
+        # 直接写进调用方提供的缓冲区，不分配新内存。返回写入的字节数
+        # extended 为 True 并且有时间戳时使用扩展包头
+        payloadBytes = self.payloadBytes
+        payloadSize = 0 if payloadBytes is None else len(payloadBytes)
+
+        if payloadSize > PACKET_MAX_PAYLOAD_SIZE:
+            raise ValueError(f'Payload is too large ({payloadSize} bytes)!')
+
+        if extended and self.timestampMS is not None:
+            _packHeadExt(buffer, offset, PACKET_CONST_HEAD_EXT, self.packetCode, payloadSize,
+                         self.timestampMS, self.sequence & _SEQUENCE_MASK)
+            overheadSize = PACKET_EXT_OVERHEAD_SIZE
+            offset += _HEAD_EXT_SIZE
+        else:
+            _packHead(buffer, offset, PACKET_CONST_HEAD, self.packetCode, payloadSize)
+            overheadSize = PACKET_OVERHEAD_SIZE
+            offset += _HEAD_SIZE
+
+        if payloadSize > 0:
+            buffer[offset:offset+payloadSize] = payloadBytes
+            offset += payloadSize
+
+        _packTail(buffer, offset, PACKET_CONST_TAIL)
+        return overheadSize + payloadSize
+
+    def encode(self, extended: bool = False) -> bytearray:
+        # 直接拼接，比先分配清零的缓冲区再写入快
+        payloadBytes = self.payloadBytes
+        payloadSize = 0 if payloadBytes is None else len(payloadBytes)
 
-        if self.payloadBytes is None:
-            _writeUInt16(buffer, 0)
+        if payloadSize > PACKET_MAX_PAYLOAD_SIZE:
+            raise ValueError(f'Payload is too large ({payloadSize} bytes)!')
+
+        if extended and self.timestampMS is not None:
+            buffer = bytearray(_HEAD_EXT_STRUCT.pack(PACKET_CONST_HEAD_EXT, self.packetCode, payloadSize,
+                                                     self.timestampMS, self.sequence & _SEQUENCE_MASK))
         else:
-            _writeUInt16(buffer, len(self.payloadBytes))
-            buffer.extend(self.payloadBytes)
+            buffer = bytearray(_HEAD_STRUCT.pack(PACKET_CONST_HEAD, self.packetCode, payloadSize))
+
+        if payloadSize > 0:
+            buffer += payloadBytes
 
-        _writeUInt16(buffer, PACKET_CONST_TAIL)
+        buffer += _TAIL_BYTES
         return buffer
 
     @classmethod
-    def decode(cls, data: bytes) -> typing.Union["Packet", None]:
-        # sizeof(CONST_HEAD + PacketCode + PayloadLength + CONST_TAIL) == 8
-        if len(data) < 8:
+    def decode(cls, data: bytes | bytearray | memoryview) -> typing.Union["Packet", None]:
+        # payloadBytes 是 data 的切片。recvfrom 收到的 bytes 很小，直接切片比包装成 memoryview 快；传入 memoryview 时不会复制数据
+        dataSize = len(data)
+
+        if dataSize < PACKET_OVERHEAD_SIZE:
             return None
 
+        head, packetCode, payloadLength = _unpackHead(data)
+
         # Check Head Const
-        if _readUInt16(data, 0) != PACKET_CONST_HEAD:
+        if head == PACKET_CONST_HEAD:
+            headSize = _HEAD_SIZE
+            timestampMS = None
+            sequence = 0
+        elif head == PACKET_CONST_HEAD_EXT and dataSize >= PACKET_EXT_OVERHEAD_SIZE:
+            _, _, _, timestampMS, sequence = _unpackHeadExt(data)
+            headSize = _HEAD_EXT_SIZE
+        else:
             return None
 
-        payloadLength = _readUInt16(data, 4)
+        payloadEnd = headSize + payloadLength
 
         # Check Packet Size
-        if len(data) != 8 + payloadLength:
+        if dataSize != payloadEnd + _TAIL_SIZE:
             return None
 
         # Check Tail Const
-        if _readUInt16(data, 6 + payloadLength) != PACKET_CONST_TAIL:
+        if _unpackTail(data, payloadEnd)[0] != PACKET_CONST_TAIL:
             return None
 
-        packetCode = _readUInt16(data, 2)
-        payloadBytes = data[6:6+payloadLength]
-        return cls(packetCode, payloadBytes)
+        return cls(packetCode, data[headSize:payloadEnd], timestampMS, sequence)
+
+class PacketWriter(object):
+    # 复用同一块缓冲区编码数据包。不是线程安全的，每个线程用自己的实例
+    # write 返回的 memoryview 只在下一次 write 之前有效
+    def __init__(self, capacity: int = 2048):
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+
+    def write(self, packet: Packet, *, extended: bool = False) -> memoryview:
+        size = packet.encodedSize(extended)
+
+        # 缓冲区不够大就扩容。写入 memoryview 而不是 bytearray，避免切片赋值时改变缓冲区大小
+        if size > len(self._view):
+            self._buffer = bytearray(max(size, len(self._buffer) * 2))
+            self._view = memoryview(self._buffer)
+
+        packet.encodeInto(self._view, extended=extended)
+        return self._view[:size]
@@ -0,0 +1,255 @@
+import queue
+import threading
+import time
+
+import cv2
+
+from cvutils import LazyLiveCapture, frameCopyStats
+from governor import AdaptiveGovernor
+from landmarkers import LandmarkerGroup
+from metrics import metrics
+
+class _LatestFrameQueue(object):
+    # 有界队列。队列满了以后丢掉最旧的帧，消费者总是拿到最新的帧
+    def __init__(self, maxsize: int):
+        self._queue = queue.Queue(maxsize=max(1, maxsize))
+        self.droppedCount = 0
+
+    def put(self, item):
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+
+            try:
+                self._queue.get_nowait()
+                self.droppedCount += 1
+            except queue.Empty:
+                pass
+
+    def putWait(self, item, timeout: float | None = None) -> bool:
+        # 不丢帧，等到队列有空位。超时返回 False
+        try:
+            self._queue.put(item, timeout=timeout)
+            return True
+        except queue.Full:
+            return False
+
+    @property
+    def isEmpty(self) -> bool:
+        return self._queue.empty()
+
+    def get(self, timeout: float | None = None):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def clear(self):
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+class FramePipeline(object):
+    def __init__(self, capture: LazyLiveCapture, landmarker: LandmarkerGroup, governor: AdaptiveGovernor | None = None, *,
+                 captureQueueSize=1, displayQueueSize=1, pollTimeoutSecs=0.1):
+        self._capture = capture
+        self._landmarker = landmarker
+        self._governor = governor
+        self._pollTimeoutSecs = pollTimeoutSecs
+
+        # 缓冲区循环使用，同时在使用的帧比缓冲区多时，正在显示的帧会被新解码的帧覆盖
+        minBufferCount = max(1, captureQueueSize) + max(1, displayQueueSize) + 3
+        if capture.bufferCount < minBufferCount:
+            raise ValueError(f'The capture has {capture.bufferCount} buffers but the pipeline needs at least {minBufferCount}!')
+
+        if governor is not None:
+            landmarker.setLatencyListener(governor.recordLatency)
+
+        self._captureQueue = _LatestFrameQueue(captureQueueSize)
+        self._displayQueue = _LatestFrameQueue(displayQueueSize)
+
+        self._stopEvent = threading.Event()
+        self._failEvent = threading.Event()
+
+        # 推理线程准备好处理下一帧时设置，采集线程下一次 grab 后才解码，推理拿到的总是刚采集的帧
+        self._frameRequestEvent = threading.Event()
+        self._threads = []
+
+        # 帧的时间戳就是采集时间（time.monotonic 的毫秒），重新 start 以后也会继续递增，mediapipe 要求这样。
+        # 同一个时钟也用来计算从采集到发送的延迟
+        self._lastTimestampMS = -1
+        self._skippedGrabCount = 0
+
+        self._grabStats = metrics.stage('capture.grab')
+        self._retrieveStats = metrics.stage('capture.retrieve')
+        self._frameAgeStats = metrics.stage('pipeline.frameAge')
+        self._detectStats = metrics.stage('pipeline.detect')
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.stop()
+
+    def start(self):
+        if self.isRunning:
+            return
+
+        self._stopEvent.clear()
+        self._failEvent.clear()
+        self._frameRequestEvent.clear()
+        self._captureQueue.clear()
+        self._displayQueue.clear()
+
+        if self._governor is not None:
+            self._governor.reset()
+
+        self._threads = [
+            threading.Thread(target=self._captureLoop, name='Capture', daemon=True),
+            threading.Thread(target=self._inferenceLoop, name='Inference', daemon=True),
+        ]
+
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        if not self.isRunning:
+            return
+
+        self._stopEvent.set()
+
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+        self._captureQueue.clear()
+        self._displayQueue.clear()
+
+    @property
+    def isRunning(self) -> bool:
+        return len(self._threads) > 0
+
+    @property
+    def failed(self) -> bool:
+        return self._failEvent.is_set()
+
+    @property
+    def droppedFrameCount(self) -> int:
+        return self._captureQueue.droppedCount + self._displayQueue.droppedCount + self._skippedGrabCount
+
+    def getDisplayFrame(self, timeout: float | None = None):
+        # 在主线程调用。OpenCV 的窗口只能在主线程操作
+        # 返回的是 LazyLiveCapture 的缓冲区，不要修改
+        return self._displayQueue.get(timeout)
+
+    def _captureLoop(self):
+        if self._capture.isFile:
+            self._fileCaptureLoop()
+            return
+
+        # 一直 grab，把驱动里缓存的旧帧取走。只有推理线程要下一帧时，才解码接下来 grab 到的那一帧
+        while not self._stopEvent.is_set():
+            startNS = time.perf_counter_ns()
+
+            if not self._capture.grab():
+                self._failEvent.set()
+                return
+
+            self._grabStats.since(startNS)
+
+            # 推理线程还没要新的帧，这一帧不用解码
+            if not self._frameRequestEvent.is_set():
+                self._skippedGrabCount += 1
+                continue
+
+            self._frameRequestEvent.clear()
+
+            startNS = time.perf_counter_ns()
+            success, img = self._capture.retrieve()
+
+            if not success:
+                self._failEvent.set()
+                return
+
+            self._retrieveStats.since(startNS)
+
+            timestampMS = int(self._capture.timestamp * 1000)
+            self._captureQueue.put((img, timestampMS))
+
+    def _fileCaptureLoop(self):
+        # 视频文件按视频的帧率读取，并且推理线程取走上一帧以后才读下一帧，按顺序处理每一帧，不会一下子读到文件末尾
+        nextReadTime = 0.0
+
+        while not self._stopEvent.is_set():
+            delaySecs = nextReadTime - time.monotonic()
+            if delaySecs > 0 and self._stopEvent.wait(delaySecs):
+                return
+
+            startNS = time.perf_counter_ns()
+            success, img = self._capture.read()
+
+            if not success:
+                self._failEvent.set()
+                return
+
+            self._retrieveStats.since(startNS)
+
+            # 推理跟不上时不追赶，从现在开始重新计时
+            fps = self._capture.sourceFps
+            if fps > 0:
+                nextReadTime = max(nextReadTime, time.monotonic() - 1 / fps) + 1 / fps
+
+            frame = (img, int(self._capture.timestamp * 1000))
+            while not self._stopEvent.is_set() and not self._captureQueue.putWait(frame, self._pollTimeoutSecs):
+                pass
+
+    def _inferenceLoop(self):
+        while not self._stopEvent.is_set():
+            self._frameRequestEvent.set()
+            frame = self._captureQueue.get(self._pollTimeoutSecs)
+
+            if frame is None:
+                continue
+
+            img, timestampMS = frame
+
+            # mediapipe 要求时间戳严格递增
+            if timestampMS <= self._lastTimestampMS:
+                continue
+
+            # 跳过推理的帧也要显示，否则预览会卡在 governor 的帧率上
+            if self._governor is not None and not self._governor.admitFrame(canSkip=not self._capture.isFile):
+                self._displayQueue.put(img)
+                continue
+
+            # 从采集到开始推理经过的时间。采集时间来自 time.monotonic，不能和 perf_counter 混用
+            self._frameAgeStats.record(time.monotonic_ns() - timestampMS * 1_000_000)
+
+            startNS = time.perf_counter_ns()
+
+            try:
+                self._landmarker.detect(self._scaleImage(img), timestampMS)
+                self._lastTimestampMS = timestampMS
+                self._detectStats.since(startNS)
+            except Exception as e:
+                print(e)
+                continue
+
+            self._displayQueue.put(img)
+
+    def _scaleImage(self, img):
+        # landmark 的坐标是归一化的，缩小后画在原图上也没问题
+        scale = 1.0 if self._governor is None else self._governor.scale
+
+        if scale >= 1.0:
+            return img
+
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        frameCopyStats.addCopy(img.nbytes)
+        return img
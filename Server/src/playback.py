@@ -0,0 +1,58 @@
+import os
+import sys
+
+def _addProtoImportPath():
+    srcFolder = os.path.dirname(__file__)
+    protosFolder = os.path.join(srcFolder, r'protos')
+
+    if protosFolder not in sys.path:
+        sys.path.insert(1, protosFolder)
+
+def main():
+    _addProtoImportPath()
+
+    import argparse
+    import time
+    import config
+    import handlers
+    import server as sv
+
+    from motionFile import MotionFileReader, MotionPlayer
+
+    parser = argparse.ArgumentParser(description='Replay a motion file to the clients without a camera.')
+    parser.add_argument('file', help='the motion file to replay')
+    parser.add_argument('-s', '--speed', type=float, default=1.0, help='the playback speed')
+    parser.add_argument('--seek', type=float, default=0.0, help='the time to start from, in seconds')
+    parser.add_argument('--loop', action='store_true', help='replay the file forever')
+    args = parser.parse_args()
+
+    reader = MotionFileReader(args.file)
+    server = sv.UDPServer(**config.SERVER_CONFIG)
+    player = MotionPlayer(reader, server, speed=args.speed, loop=args.loop)
+
+    durationSecs = (reader.endTimestampMS - reader.startTimestampMS) / 1000
+    print(f'Loaded {reader.recordCount} packets ({durationSecs:.1f}s) from \'{args.file}\'.')
+
+    try:
+        server.start()
+
+        while True:
+            server.tick()
+
+            if server.clientCount <= 0:
+                player.stop()
+                time.sleep(1)
+                continue
+
+            if player.finished:
+                break
+
+            player.start(reader.startTimestampMS + int(args.seek * 1000))
+            time.sleep(0.1)
+    finally:
+        player.stop()
+        server.close()
+        reader.close()
+
+if __name__ == '__main__':
+    main()
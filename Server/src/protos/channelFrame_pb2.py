@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: channelFrame.proto
+# Protobuf Python Version: 4.24.0-main
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x12\x63hannelFrame.proto\"\x84\x01\n\x0c\x43hannelFrame\x12\x0e\n\x06stream\x18\x01 \x01(\r\x12\x10\n\x08sequence\x18\x02 \x01(\r\x12\x16\n\x0e\x63hannelIndices\x18\x03 \x01(\x0c\x12\x15\n\rchannelValues\x18\x04 \x01(\x0c\x12\x11\n\tsubjectId\x18\x05 \x01(\r\x12\x10\n\x08sourceId\x18\x06 \x01(\rB\x1f\xaa\x02\x1cHSR.MotionCapture.Net.Protosb\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'channelFrame_pb2', _globals)
+if _descriptor._USE_C_DESCRIPTORS == False:
+  _globals['DESCRIPTOR']._options = None
+  _globals['DESCRIPTOR']._serialized_options = b'\252\002\034HSR.MotionCapture.Net.Protos'
+  _globals['_CHANNELFRAME']._serialized_start=23
+  _globals['_CHANNELFRAME']._serialized_end=155
+# @@protoc_insertion_point(module_scope)
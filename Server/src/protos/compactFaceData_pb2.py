@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: compactFaceData.proto
+# Protobuf Python Version: 4.24.0-main
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+import unityQuaternion_pb2 as unityQuaternion__pb2
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x15\x63ompactFaceData.proto\x1a\x15unityQuaternion.proto\"x\n\x0f\x43ompactFaceData\x12&\n\x0cheadRotation\x18\x01 \x01(\x0b\x32\x10.UnityQuaternion\x12\x18\n\x10\x62lendShapeValues\x18\x02 \x01(\x0c\x12\x11\n\tsubjectId\x18\x03 \x01(\r\x12\x10\n\x08sourceId\x18\x04 \x01(\rB\x1f\xaa\x02\x1cHSR.MotionCapture.Net.Protosb\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'compactFaceData_pb2', _globals)
+if _descriptor._USE_C_DESCRIPTORS == False:
+  _globals['DESCRIPTOR']._options = None
+  _globals['DESCRIPTOR']._serialized_options = b'\252\002\034HSR.MotionCapture.Net.Protos'
+  _globals['_COMPACTFACEDATA']._serialized_start=48
+  _globals['_COMPACTFACEDATA']._serialized_end=168
+# @@protoc_insertion_point(module_scope)
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: frameData.proto
+# Protobuf Python Version: 4.24.0-main
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0f\x66rameData.proto\"C\n\tFrameData\x12\x13\n\x0btimestampMS\x18\x01 \x01(\x03\x12\x0f\n\x07packets\x18\x02 \x03(\x0c\x12\x10\n\x08sourceId\x18\x03 \x01(\rB\x1f\xaa\x02\x1cHSR.MotionCapture.Net.Protosb\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'frameData_pb2', _globals)
+if _descriptor._USE_C_DESCRIPTORS == False:
+  _globals['DESCRIPTOR']._options = None
+  _globals['DESCRIPTOR']._serialized_options = b'\252\002\034HSR.MotionCapture.Net.Protos'
+  _globals['_FRAMEDATA']._serialized_start=19
+  _globals['_FRAMEDATA']._serialized_end=86
+# @@protoc_insertion_point(module_scope)
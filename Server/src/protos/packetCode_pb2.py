@@ -14,7 +14,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x10packetCode.proto*\x88\x01\n\nPacketCode\x12\x08\n\x04NONE\x10\x00\x12\x0f\n\x0bQUIT_NOTIFY\x10\x01\x12\x12\n\x0eHEART_BEAT_REQ\x10\x04\x12\x12\n\x0eHEART_BEAT_RSP\x10\x05\x12\r\n\tFACE_DATA\x10\x06\x12\r\n\tPOSE_DATA\x10\x07\x12\r\n\tHAND_DATA\x10\x08\"\x04\x08\x02\x10\x02\"\x04\x08\x03\x10\x03\x42\x1f\xaa\x02\x1cHSR.MotionCapture.Net.Protosb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x10packetCode.proto*\xeb\x02\n\nPacketCode\x12\x08\n\x04NONE\x10\x00\x12\x0f\n\x0bQUIT_NOTIFY\x10\x01\x12\x12\n\x0eHEART_BEAT_REQ\x10\x04\x12\x12\n\x0eHEART_BEAT_RSP\x10\x05\x12\r\n\tFACE_DATA\x10\x06\x12\r\n\tPOSE_DATA\x10\x07\x12\r\n\tHAND_DATA\x10\x08\x12\x13\n\x0f\x46\x41\x43\x45_SCHEMA_REQ\x10\t\x12\x13\n\x0f\x46\x41\x43\x45_SCHEMA_RSP\x10\n\x12\x15\n\x11\x43OMPACT_FACE_DATA\x10\x0b\x12\x10\n\x0cKEYFRAME_REQ\x10\x0c\x12\x11\n\rKEYFRAME_DATA\x10\r\x12\x0e\n\nDELTA_DATA\x10\x0e\x12\x0e\n\nFRAME_DATA\x10\x0f\x12\x0e\n\nTIMING_REQ\x10\x10\x12\x08\n\x04PING\x10\x11\x12\x08\n\x04PONG\x10\x12\x12\x11\n\rMULTICAST_REQ\x10\x13\x12\x11\n\rMULTICAST_RSP\x10\x14\x12\x11\n\rSUBSCRIBE_REQ\x10\x15\"\x04\x08\x02\x10\x02\"\x04\x08\x03\x10\x03\x42\x1f\xaa\x02\x1cHSR.MotionCapture.Net.Protosb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -23,5 +23,5 @@ if _descriptor._USE_C_DESCRIPTORS == False:
   _globals['DESCRIPTOR']._options = None
   _globals['DESCRIPTOR']._serialized_options = b'\252\002\034HSR.MotionCapture.Net.Protos'
   _globals['_PACKETCODE']._serialized_start=21
-  _globals['_PACKETCODE']._serialized_end=157
+  _globals['_PACKETCODE']._serialized_end=384
 # @@protoc_insertion_point(module_scope)
@@ -15,7 +15,7 @@ _sym_db = _symbol_database.Default()
 import unityVector3_pb2 as unityVector3__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0eposeData.proto\x1a\x12unityVector3.proto\",\n\x08PoseData\x12 \n\tlandmarks\x18\x01 \x03(\x0b\x32\r.UnityVector3B\x1f\xaa\x02\x1cHSR.MotionCapture.Net.Protosb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0eposeData.proto\x1a\x12unityVector3.proto\"\xb7\x01\n\x08PoseData\x12 \n\tlandmarks\x18\x01 \x03(\x0b\x32\r.UnityVector3\x12\x15\n\rlandmarkCount\x18\x02 \x01(\r\x12\x17\n\x0fpackedLandmarks\x18\x03 \x01(\x0c\x12\x1c\n\x14packedWorldLandmarks\x18\x04 \x01(\x0c\x12\x16\n\x0evisibilityMask\x18\x05 \x01(\x0c\x12\x11\n\tsubjectId\x18\x06 \x01(\r\x12\x10\n\x08sourceId\x18\x07 \x01(\rB\x1f\xaa\x02\x1cHSR.MotionCapture.Net.Protosb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -23,6 +23,6 @@ _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'poseData_pb2', _globals)
 if _descriptor._USE_C_DESCRIPTORS == False:
   _globals['DESCRIPTOR']._options = None
   _globals['DESCRIPTOR']._serialized_options = b'\252\002\034HSR.MotionCapture.Net.Protos'
-  _globals['_POSEDATA']._serialized_start=38
-  _globals['_POSEDATA']._serialized_end=82
+  _globals['_POSEDATA']._serialized_start=39
+  _globals['_POSEDATA']._serialized_end=222
 # @@protoc_insertion_point(module_scope)
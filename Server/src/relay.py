@@ -0,0 +1,51 @@
+import os
+import sys
+
+def _addProtoImportPath():
+    srcFolder = os.path.dirname(__file__)
+    protosFolder = os.path.join(srcFolder, r'protos')
+
+    if protosFolder not in sys.path:
+        sys.path.insert(1, protosFolder)
+
+def main():
+    _addProtoImportPath()
+
+    import argparse
+    import time
+    import config
+    import handlers
+    import metrics as mt
+    import server as sv
+
+    from upstream import Relay
+
+    relayConfig = config.RELAY_CONFIG
+
+    parser = argparse.ArgumentParser(description='Forward the packets of a capture server (or another relay) to more clients.')
+    parser.add_argument('--upstream-host', default=relayConfig['upstreamHost'], help='the address of the upstream server')
+    parser.add_argument('--upstream-port', type=int, default=relayConfig['upstreamPort'], help='the port of the upstream server')
+    parser.add_argument('-p', '--port', type=int, default=relayConfig['port'], help='the port of this relay')
+    args = parser.parse_args()
+
+    server = sv.UDPServer(**{ **config.SERVER_CONFIG, 'port': args.port })
+    relay = Relay(server, (args.upstream_host, args.upstream_port),
+                  heartBeatIntervalSecs=relayConfig['heartBeatIntervalSecs'], timeoutSecs=relayConfig['timeoutSecs'])
+    metricsReporter = mt.MetricsReporter(**{ **config.METRICS_CONFIG, 'httpPort': None })
+
+    try:
+        server.start()
+        relay.start()
+
+        while True:
+            server.tick()
+            relay.tick()
+            metricsReporter.tick()
+            time.sleep(0.1)
+    finally:
+        relay.close()
+        server.close()
+        metricsReporter.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,26 +1,106 @@
+import collections
+import selectors
 import socket
 import threading
+import time
+import typing
 
-from datetime import datetime
-from packet import Packet
+from metrics import metrics
+from netutils import BatchSender
+from packet import Packet, PacketWriter
+from protos.multicast_pb2 import MulticastInfo
 from protos.packetCode_pb2 import PacketCode
+from protos.ping_pb2 import Ping
+from timing import ClientTiming, RateLimiter, monotonicMS
+
+# 只有显式订阅的客户端才会收到这些广播包，其他广播包默认发给所有客户端
+OPT_IN_PACKET_CODES = frozenset([
+    PacketCode.COMPACT_FACE_DATA,
+    PacketCode.KEYFRAME_DATA,
+    PacketCode.DELTA_DATA,
+    PacketCode.PING,
+])
+
+# 开启组播后，这些广播包只往组播地址发送一次，不再发给已经加入组播的客户端
+# 控制包（心跳、QUIT_NOTIFY 等）和需要订阅的包仍然走单播
+MULTICAST_PACKET_CODES = frozenset([
+    PacketCode.FACE_DATA,
+    PacketCode.POSE_DATA,
+    PacketCode.HAND_DATA,
+    PacketCode.FRAME_DATA,
+])
+
+# 不是数据，客户端改变订阅时保持原样
+_SYSTEM_PACKET_CODES = frozenset([
+    PacketCode.QUIT_NOTIFY,
+    PacketCode.PING,
+])
+
+# 增量数据流少了一帧接收方就要等下一个关键帧，所以不按客户端的 maxRate 降频
+_UNDECIMATED_PACKET_CODES = frozenset([
+    PacketCode.KEYFRAME_DATA,
+    PacketCode.DELTA_DATA,
+])
 
 class UDPServer(object):
     _clientPacketHandlers = {}
 
-    def __init__(self, port: int, *, heartBeatTimeoutSecs=10.0, recvBufferSize=2048):
+    def __init__(self, port: int, *, heartBeatTimeoutSecs=10.0, recvBufferSize=2048, recvPollTimeoutSecs=0.1,
+                 sendBufferSize=2048, useSendMMsg=True, pingIntervalSecs=1.0, pingTimeoutSecs=2.0,
+                 multicastGroup: str | None = None, multicastPort=5003, multicastTTL=1, multicastInterface: str | None = None):
         self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self._sock.setblocking(False) # settimeout(0.0)
 
         self._sock.bind(('0.0.0.0', port))
 
-        self._heartBeatTimeoutSecs = heartBeatTimeoutSecs
+        # 组播也用这个 socket 发送
+        self._multicastAddr = None
+        if multicastGroup is not None:
+            self._multicastAddr = (multicastGroup, multicastPort)
+            self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, multicastTTL)
+            self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+
+            if multicastInterface is not None:
+                self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(multicastInterface))
+
+        self._heartBeatTimeoutMS = int(heartBeatTimeoutSecs * 1000)
         self._recvBufferSize = recvBufferSize
+        self._recvPollTimeoutSecs = recvPollTimeoutSecs
+        self._sendBufferSize = sendBufferSize
+        self._pingIntervalMS = int(pingIntervalSecs * 1000)
+        self._pingTimeoutMS = int(pingTimeoutSecs * 1000)
+
+        # send 会在多个线程里调用，每个线程用自己的缓冲区
+        self._packetWriters = threading.local()
+        self._batchSender = BatchSender(self._sock, useSendMMsg=useSendMMsg)
+
+        self._encodeStats = metrics.stage('server.encode')
+        self._sendStats = metrics.stage('server.send')
+        self._captureToSendStats = metrics.stage('server.captureToSend')
 
         self._clients = set()
-        self._clientLastHeartBeatTimes = {}
+
+        # client -> 上一次心跳的时间（monotonicMS），按时间从早到晚排列。
+        # 所有客户端的超时时间相同，刷新时移到末尾就能保持顺序，检查时只需要看开头过期的那些
+        self._clientLastHeartBeatTimes = collections.OrderedDict()
+        self._clientSubscriptions = {}
+        self._clientSubjectIds = {} # client -> frozenset，只收这些对象的数据
+        self._clientSourceIds = {} # client -> frozenset，只收这些采集源的数据
+        self._clientRateLimiters = {} # client -> RateLimiter
         self._clientLock = threading.Lock()
 
+        # 发送过 TIMING_REQ 的客户端：使用扩展包头，并且定期收到 PING
+        self._clientTimings = {}
+        self._pingSequence = 0
+
+        # 已经加入组播的客户端
+        self._multicastClients = set()
+        self._lastPingTimeMS = 0
+
+        # 记录广播的数据包，参考 motionFile.MotionFileWriter
+        self._recorder = None
+        self._recordStartTime = 0.0
+
         self._recvThreadStopEvent = threading.Event()
         self._recvThread = threading.Thread(target=self._recv)
 
@@ -32,79 +112,351 @@ class UDPServer(object):
         self.close()
 
     def _recv(self):
-        while not self._recvThreadStopEvent.is_set():
-            try:
-                data, addr = self._sock.recvfrom(self._recvBufferSize)
-            except:
-                continue
+        # 没有数据时阻塞在 select 上，不占用 CPU。超时只是为了能及时检查 stop event
+        with selectors.DefaultSelector() as selector:
+            selector.register(self._sock, selectors.EVENT_READ)
 
-            packet = Packet.decode(data)
+            while not self._recvThreadStopEvent.is_set():
+                if not selector.select(self._recvPollTimeoutSecs):
+                    continue
 
-            if packet is None:
-                print(f'A bad packet was received from {addr}!')
-                continue
+                # 一次把缓冲区里的包都读完
+                while True:
+                    try:
+                        data, addr = self._sock.recvfrom(self._recvBufferSize)
+                    except BlockingIOError:
+                        break
+                    except OSError:
+                        # Windows 上客户端断开后可能会收到 ConnectionResetError
+                        continue
 
-            handler = self.__class__._clientPacketHandlers.get(packet.packetCode, None)
+                    self._handlePacket(data, addr)
 
-            if handler is None:
-                print(f'Packet \'{packet.packetCode}\' has no handler!')
-                continue
+    def _handlePacket(self, data: bytes, addr):
+        packet = Packet.decode(data)
 
-            # handler 可能会调用 send，所以在调用 handler 前加上 client
-            self._clientLock.acquire()
-            try:
-                if addr not in self._clients:
-                    self._clients.add(addr)
-                    print(f'New client {addr} was added!')
-            finally:
-                self._clientLock.release()
+        if packet is None:
+            print(f'A bad packet was received from {addr}!')
+            return
+
+        handler = self.__class__._clientPacketHandlers.get(packet.packetCode, None)
+
+        if handler is None:
+            print(f'Packet \'{packet.packetCode}\' has no handler!')
+            return
+
+        # handler 可能会调用 send，所以在调用 handler 前加上 client
+        self._clientLock.acquire()
+        try:
+            if addr not in self._clients:
+                self._clients.add(addr)
 
+                # 还没有发过心跳的客户端在下一次 tick 时就会被移除
+                self._clientLastHeartBeatTimes[addr] = None
+                self._clientLastHeartBeatTimes.move_to_end(addr, last=False)
+                print(f'New client {addr} was added!')
+        finally:
+            self._clientLock.release()
+
+        # 客户端发来的数据不可信，一个处理失败的包不能让接收线程退出
+        try:
             handler(self, addr, packet)
+        except Exception as e:
+            print(f'Failed to handle packet \'{PacketCode.Name(packet.packetCode)}\' from {addr}: {e}')
+
+    def _getPacketWriter(self) -> PacketWriter:
+        writer = getattr(self._packetWriters, 'writer', None)
+
+        if writer is None:
+            writer = PacketWriter(self._sendBufferSize)
+            self._packetWriters.writer = writer
+        return writer
 
     def send(self, packet: Packet, *, clientAddr=...):
-        data = packet.encode()
+        # 每次广播最多编码两次（普通包头和扩展包头），同一种包头的客户端共用同一份数据
+        writer = self._getPacketWriter()
 
         if clientAddr is ...:
+            # 只在复制客户端列表的时候加锁，不要在锁里发送
             self._clientLock.acquire()
             try:
-                for client in self._clients:
-                    self._sock.sendto(data, client)
+                clients = [c for c in self._clients if self._isSubscribed(c, packet.packetCode)]
+                extendedClients = []
+
+                # 发送过 SUBSCRIBE_REQ 的客户端还要按采集源、对象和频率过滤
+                if len(self._clientSourceIds) > 0:
+                    clients = [c for c in clients if self._wantsSource(c, packet.sourceId)]
+
+                if packet.subjectId != 0 and len(self._clientSubjectIds) > 0:
+                    clients = [c for c in clients if self._wantsSubject(c, packet.subjectId)]
+
+                if len(self._clientRateLimiters) > 0 and packet.packetCode not in _UNDECIMATED_PACKET_CODES:
+                    nowMS = packet.timestampMS if packet.hasTimestamp else monotonicMS()
+                    key = (packet.packetCode, packet.sourceId, packet.subjectId)
+                    clients = [c for c in clients if self._admitRate(c, key, nowMS)]
+
+                # 只要有一个订阅的客户端加入了组播，就往组播地址发一次，和普通包头的客户端共用同一份数据
+                if packet.packetCode in MULTICAST_PACKET_CODES and len(self._multicastClients) > 0:
+                    unicastClients = [c for c in clients if c not in self._multicastClients]
+
+                    if len(unicastClients) < len(clients):
+                        clients = unicastClients
+                        clients.append(self._multicastAddr)
+
+                if packet.hasTimestamp and len(self._clientTimings) > 0:
+                    # 组播只用普通包头
+                    extendedClients = [c for c in clients if c in self._clientTimings]
+                    clients = [c for c in clients if c not in self._clientTimings]
             finally:
                 self._clientLock.release()
+
+            for targetClients, extended in ((clients, False), (extendedClients, True)):
+                if len(targetClients) == 0:
+                    continue
+
+                startNS = time.perf_counter_ns()
+                data = writer.write(packet, extended=extended)
+                self._encodeStats.since(startNS)
+
+                startNS = time.perf_counter_ns()
+                self._batchSender.sendTo(data, targetClients)
+                self._sendStats.since(startNS)
+                metrics.recordSend(targetClients, len(data))
+
+            if packet.hasTimestamp:
+                self._recordCaptureToSend(packet, extendedClients)
+
+            recorder = self._recorder
+            if recorder is not None:
+                recorder.write(int((time.monotonic() - self._recordStartTime) * 1000), packet)
         else:
+            data = writer.write(packet, extended=clientAddr in self._clientTimings)
             self._sock.sendto(data, clientAddr)
+            metrics.recordSend((clientAddr,), len(data))
+
+    def _recordCaptureToSend(self, packet: Packet, clients: list):
+        captureToSendMS = monotonicMS() - packet.timestampMS
+        self._captureToSendStats.record(captureToSendMS * 1_000_000)
+
+        self._clientLock.acquire()
+        try:
+            for client in clients:
+                timing = self._clientTimings.get(client, None)
+                if timing is not None:
+                    timing.onSend(captureToSendMS)
+        finally:
+            self._clientLock.release()
+
+    def setRecorder(self, recorder):
+        # recorder 需要有 write(timestampMS, packet) 方法，传入 None 停止记录
+        # 时间戳从调用这个方法时开始计算
+        self._recordStartTime = time.monotonic()
+        self._recorder = recorder
 
     def tick(self):
         self._checkClientHeartBeats()
+        self._sendPings()
+
+    def _sendPings(self):
+        nowMS = monotonicMS()
+
+        if nowMS - self._lastPingTimeMS < self._pingIntervalMS:
+            return
+
+        self._lastPingTimeMS = nowMS
+
+        # 没有客户端发送过 TIMING_REQ 时什么都不做
+        if len(self._clientTimings) == 0:
+            return
+
+        self._pingSequence = (self._pingSequence + 1) & 0xFFFFFFFF
+
+        ping = Ping()
+        ping.sequence = self._pingSequence
+        ping.timestampMS = nowMS
+
+        self._clientLock.acquire()
+        try:
+            clients = [c for c in self._clientTimings if self._isSubscribed(c, PacketCode.PING)]
+
+            for client in clients:
+                timing = self._clientTimings[client]
+                timing.onPingSent(ping.sequence, ping.timestampMS)
+
+                metrics.setClientTiming(client, rttMS=timing.rttMS, lossRate=timing.lossRate(nowMS, self._pingTimeoutMS),
+                                        captureToSendMS=timing.captureToSendMS)
+        finally:
+            self._clientLock.release()
+
+        # 只单独发给这些客户端，不是广播，也就不会被录制下来
+        packet = Packet(PacketCode.PING, ping.SerializeToString())
+        for client in clients:
+            self.send(packet, clientAddr=client)
 
     def _checkClientHeartBeats(self):
-        now = datetime.now()
+        # 每次 tick 都会调用，只处理已经超时的客户端，和客户端的总数无关
+        expireTimeMS = monotonicMS() - self._heartBeatTimeoutMS
 
         self._clientLock.acquire()
         try:
-            for client in self._clients:
-                lastHeartBeatTime = self._clientLastHeartBeatTimes.get(client, datetime.min)
-                if (now - lastHeartBeatTime).seconds >= self._heartBeatTimeoutSecs:
-                    self._clientLastHeartBeatTimes.pop(client, None)
-                    print(f'Client {client} lost connection!')
-
-            self._clients.clear()
-            self._clients.update(self._clientLastHeartBeatTimes.keys())
+            heartBeatTimes = self._clientLastHeartBeatTimes
+
+            while len(heartBeatTimes) > 0:
+                client, lastHeartBeatTime = next(iter(heartBeatTimes.items()))
+
+                if lastHeartBeatTime is not None and lastHeartBeatTime > expireTimeMS:
+                    break
+
+                self._forgetClient(client)
+                print(f'Client {client} lost connection!')
         finally:
             self._clientLock.release()
 
     def refreshClientLastHeartBeatTime(self, clientAddr):
         self._clientLock.acquire()
         try:
-            self._clientLastHeartBeatTimes[clientAddr] = datetime.now()
+            self._clients.add(clientAddr)
+            self._clientLastHeartBeatTimes[clientAddr] = monotonicMS()
+            self._clientLastHeartBeatTimes.move_to_end(clientAddr)
         finally:
             self._clientLock.release()
 
     def removeClient(self, clientAddr):
         self._clientLock.acquire()
         try:
-            self._clients.discard(clientAddr)
-            self._clientLastHeartBeatTimes.pop(clientAddr, None)
+            self._forgetClient(clientAddr)
+        finally:
+            self._clientLock.release()
+
+    def _forgetClient(self, clientAddr):
+        # 调用前需要加锁
+        self._clients.discard(clientAddr)
+        self._clientLastHeartBeatTimes.pop(clientAddr, None)
+        self._clientSubscriptions.pop(clientAddr, None)
+        self._clientSubjectIds.pop(clientAddr, None)
+        self._clientSourceIds.pop(clientAddr, None)
+        self._clientRateLimiters.pop(clientAddr, None)
+        self._clientTimings.pop(clientAddr, None)
+        self._multicastClients.discard(clientAddr)
+        self._batchSender.forget(clientAddr)
+        metrics.forgetClient(clientAddr)
+
+    def _isSubscribed(self, clientAddr, packetCode: PacketCode) -> bool:
+        subscriptions = self._clientSubscriptions.get(clientAddr, None)
+
+        if subscriptions is None:
+            return packetCode not in OPT_IN_PACKET_CODES
+        return packetCode in subscriptions
+
+    def _wantsSubject(self, clientAddr, subjectId: int) -> bool:
+        subjectIds = self._clientSubjectIds.get(clientAddr, None)
+        return subjectIds is None or subjectId in subjectIds
+
+    def _wantsSource(self, clientAddr, sourceId: int) -> bool:
+        sourceIds = self._clientSourceIds.get(clientAddr, None)
+        return sourceIds is None or sourceId in sourceIds
+
+    def _admitRate(self, clientAddr, key, nowMS: int) -> bool:
+        rateLimiter = self._clientRateLimiters.get(clientAddr, None)
+        return rateLimiter is None or rateLimiter.admit(key, nowMS)
+
+    def _getOrCreateSubscriptions(self, clientAddr) -> set:
+        subscriptions = self._clientSubscriptions.get(clientAddr, None)
+
+        if subscriptions is None:
+            subscriptions = set(PacketCode.values()) - OPT_IN_PACKET_CODES
+            self._clientSubscriptions[clientAddr] = subscriptions
+        return subscriptions
+
+    def subscribe(self, clientAddr, *packetCodes: PacketCode):
+        self._clientLock.acquire()
+        try:
+            self._getOrCreateSubscriptions(clientAddr).update(packetCodes)
+        finally:
+            self._clientLock.release()
+
+    def unsubscribe(self, clientAddr, *packetCodes: PacketCode):
+        self._clientLock.acquire()
+        try:
+            self._getOrCreateSubscriptions(clientAddr).difference_update(packetCodes)
+        finally:
+            self._clientLock.release()
+
+    def setSubscription(self, clientAddr, packetCodes: typing.Iterable[PacketCode], subjectIds: typing.Iterable[int], maxRate: float,
+                        sourceIds: typing.Iterable[int] = ()):
+        # packetCodes 为空时不改变订阅的数据包，subjectIds 和 sourceIds 为空表示所有对象和采集源，maxRate 不大于 0 表示不限制频率
+        # QUIT_NOTIFY 和 PING 不受影响
+        packetCodes = set(packetCodes)
+        subjectIds = frozenset(subjectIds)
+        sourceIds = frozenset(sourceIds)
+
+        self._clientLock.acquire()
+        try:
+            if len(packetCodes) > 0:
+                subscriptions = self._getOrCreateSubscriptions(clientAddr)
+                kept = subscriptions & _SYSTEM_PACKET_CODES
+                subscriptions.clear()
+                subscriptions.update(packetCodes, kept)
+
+            if len(subjectIds) > 0:
+                self._clientSubjectIds[clientAddr] = subjectIds
+            else:
+                self._clientSubjectIds.pop(clientAddr, None)
+
+            if len(sourceIds) > 0:
+                self._clientSourceIds[clientAddr] = sourceIds
+            else:
+                self._clientSourceIds.pop(clientAddr, None)
+
+            if maxRate > 0:
+                self._clientRateLimiters[clientAddr] = RateLimiter(maxRate)
+            else:
+                self._clientRateLimiters.pop(clientAddr, None)
+        finally:
+            self._clientLock.release()
+
+    def enableTiming(self, clientAddr):
+        # 之后给这个客户端发送扩展包头，并且定期发送 PING
+        self._clientLock.acquire()
+        try:
+            if clientAddr not in self._clientTimings:
+                self._clientTimings[clientAddr] = ClientTiming()
+            self._getOrCreateSubscriptions(clientAddr).add(PacketCode.PING)
+        finally:
+            self._clientLock.release()
+
+    def joinMulticast(self, clientAddr) -> Packet | None:
+        # 返回 MULTICAST_RSP。没有开启组播时 group 为空，客户端继续用单播接收
+        # 还没有完成心跳握手的客户端返回 None，不能加入组播
+        info = MulticastInfo()
+
+        self._clientLock.acquire()
+        try:
+            if self._clientLastHeartBeatTimes.get(clientAddr, None) is None:
+                return None
+
+            if self._multicastAddr is not None:
+                info.group, info.port = self._multicastAddr
+                self._multicastClients.add(clientAddr)
+        finally:
+            self._clientLock.release()
+
+        return Packet(PacketCode.MULTICAST_RSP, info.SerializeToString())
+
+    def handlePong(self, clientAddr, ping: Ping):
+        self._clientLock.acquire()
+        try:
+            timing = self._clientTimings.get(clientAddr, None)
+            if timing is not None:
+                timing.onPong(ping.sequence, ping.timestampMS, monotonicMS())
+        finally:
+            self._clientLock.release()
+
+    def hasSubscribers(self, packetCode: PacketCode) -> bool:
+        # 没有客户端需要的包就不用创建了
+        self._clientLock.acquire()
+        try:
+            return any(self._isSubscribed(client, packetCode) for client in self._clients)
         finally:
             self._clientLock.release()
 
@@ -0,0 +1,202 @@
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+
+import channelStream
+
+from metrics import metrics
+from packet import Packet
+from server import UDPServer
+from protos.packetCode_pb2 import PacketCode
+
+_PACKET_CODE_COUNT = max(PacketCode.values()) + 1
+
+def _addProtoImportPath():
+    srcFolder = os.path.dirname(__file__)
+    protosFolder = os.path.join(srcFolder, r'protos')
+
+    if protosFolder not in sys.path:
+        sys.path.insert(1, protosFolder)
+
+class _WorkerServer(object):
+    # 代替 UDPServer 传给工作进程里的 Landmarker，把数据包交给主进程发送
+    def __init__(self, packetQueue, subscribedFlags):
+        self._packetQueue = packetQueue
+        self._subscribedFlags = subscribedFlags
+
+    def hasSubscribers(self, packetCode) -> bool:
+        # 主进程每次 tick 更新一次
+        return packetCode < _PACKET_CODE_COUNT and self._subscribedFlags[packetCode] != 0
+
+    def send(self, packet: Packet, *, clientAddr=...):
+        #! 在 mediapipe 的子线程执行
+        # 主进程发送不过来时丢掉新的数据包，不要阻塞推理
+        try:
+            self._packetQueue.put_nowait((packet.packetCode, bytes(packet.payloadBytes or b''), packet.timestampMS,
+                                          packet.sequence, packet.subjectId, packet.sourceId))
+        except queue.Full:
+            pass
+
+def _runSource(sourceId: int, captureConfig: dict, packetQueue, subscribedFlags, controlQueue, runEvent, stopEvent):
+    #! 在工作进程执行，和 main.py 里只有一个采集源时的主循环相同
+    _addProtoImportPath()
+
+    import cv2
+    import config
+    import cvutils
+    import governor as gv
+    import metrics as mt
+    import pipeline as pl
+
+    server = _WorkerServer(packetQueue, subscribedFlags)
+    capture = cvutils.LazyLiveCapture(**captureConfig)
+    window = cvutils.LazyLiveWindow(**{ **config.WINDOW_CONFIG, 'name': f'{config.WINDOW_CONFIG["name"]} {sourceId}' })
+    landmarker = config.getLandmarker(server, source_id=sourceId)
+    governor = gv.AdaptiveGovernor(**config.GOVERNOR_CONFIG)
+    pipeline = pl.FramePipeline(capture, landmarker, governor, **config.PIPELINE_CONFIG)
+
+    # 工作进程的统计数据只打印，HTTP 端口由主进程使用
+    metricsReporter = mt.MetricsReporter(**{ **config.METRICS_CONFIG, 'httpPort': None })
+
+    try:
+        while not stopEvent.is_set():
+            metricsReporter.tick()
+
+            # 客户端发来的 KEYFRAME_REQ
+            while True:
+                try:
+                    stream = controlQueue.get_nowait()
+                except queue.Empty:
+                    break
+                channelStream.requestKeyframe(stream)
+
+            if not runEvent.is_set():
+                pipeline.stop()
+                capture.release()
+                window.close()
+                landmarker.stop()
+                runEvent.wait(1)
+                continue
+
+            pipeline.start()
+            img = pipeline.getDisplayFrame(timeout=0.1)
+
+            if pipeline.failed:
+                print(f'Source {sourceId} failed!')
+                exit(-1)
+
+            if img is not None:
+                window.showImage(img, landmarker.drawLandmarks)
+
+            if (cv2.waitKey(1) & 0xFF) == ord('q'):
+                return
+    finally:
+        pipeline.stop()
+        capture.release()
+        window.close()
+        landmarker.close()
+
+class SourceWorkerPool(object):
+    # 每个采集源在一个工作进程里采集和推理，数据包由主进程的 server 统一发送
+    # 工作进程之间不共享 GIL，多个摄像头可以用满所有核心
+    def __init__(self, server: UDPServer, captureConfigs: list[dict], *, packetQueueSize=256, pollTimeoutSecs=0.1):
+        self._server = server
+        self._pollTimeoutSecs = pollTimeoutSecs
+
+        # 和 Windows 一样用 spawn，mediapipe 的线程不能被 fork
+        context = multiprocessing.get_context('spawn')
+
+        self._packetQueue = context.Queue(packetQueueSize)
+        self._subscribedFlags = context.Array('b', _PACKET_CODE_COUNT, lock=False)
+        self._runEvent = context.Event()
+        self._stopEvent = context.Event()
+        self._controlQueues = [context.Queue() for _ in captureConfigs]
+
+        self._processes = [
+            context.Process(target=_runSource, name=f'Source{i}', daemon=True,
+                            args=(i, captureConfig, self._packetQueue, self._subscribedFlags, self._controlQueues[i],
+                                  self._runEvent, self._stopEvent))
+            for i, captureConfig in enumerate(captureConfigs)
+        ]
+
+        self._forwardStats = metrics.stage('sources.forward')
+        self._forwardThreadStopEvent = threading.Event()
+        self._forwardThread = threading.Thread(target=self._forward, name='Sources', daemon=True)
+
+        # 客户端的 KEYFRAME_REQ 转发给所有工作进程
+        channelStream.addKeyframeSource(PacketCode.FACE_DATA, self)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    @property
+    def sourceCount(self) -> int:
+        return len(self._processes)
+
+    @property
+    def exitCode(self) -> int | None:
+        # 有一个工作进程退出了（失败或者按了 q），就返回它的退出码
+        for process in self._processes:
+            if process.exitcode is not None:
+                return process.exitcode
+        return None
+
+    def start(self):
+        self.tick()
+
+        for process in self._processes:
+            process.start()
+        self._forwardThread.start()
+
+        print(f'Start {len(self._processes)} capture sources...')
+
+    def close(self):
+        self._stopEvent.set()
+        self._runEvent.set() # 唤醒等待中的工作进程
+
+        for process in self._processes:
+            if process.pid is None:
+                continue
+
+            process.join(5)
+
+            if process.is_alive():
+                process.terminate()
+
+        self._forwardThreadStopEvent.set()
+        if self._forwardThread.is_alive():
+            self._forwardThread.join()
+
+    def tick(self):
+        # 告诉工作进程哪些数据包有人需要，以及是否需要采集
+        for packetCode in PacketCode.values():
+            self._subscribedFlags[packetCode] = self._server.hasSubscribers(packetCode)
+
+        if self._server.clientCount > 0:
+            self._runEvent.set()
+        else:
+            self._runEvent.clear()
+
+    def requestKeyframe(self):
+        #! 在接收线程调用
+        for controlQueue in self._controlQueues:
+            controlQueue.put(PacketCode.FACE_DATA)
+
+    def _forward(self):
+        while not self._forwardThreadStopEvent.is_set():
+            try:
+                packetCode, payloadBytes, timestampMS, sequence, subjectId, sourceId = self._packetQueue.get(timeout=self._pollTimeoutSecs)
+            except queue.Empty:
+                continue
+
+            startNS = time.perf_counter_ns()
+            self._server.send(Packet(packetCode, payloadBytes, timestampMS=timestampMS, sequence=sequence,
+                                     subjectId=subjectId, sourceId=sourceId))
+            self._forwardStats.since(startNS)
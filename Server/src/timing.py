@@ -0,0 +1,91 @@
+import collections
+import time
+
+def monotonicMS() -> int:
+    # 帧的时间戳、PING 的时间戳都用这个时钟
+    return time.monotonic_ns() // 1_000_000
+
+class ClientTiming(object):
+    # 一个客户端的往返时间、丢包率和从采集到发送的延迟
+    def __init__(self, *, windowSize=30, smoothing=0.2):
+        self._windowSize = windowSize
+        self._smoothing = smoothing
+
+        # 最近发出的 PING。sequence -> [发送时间, 是否收到 PONG]
+        self._pings = collections.OrderedDict()
+
+        self.rttMS = None
+        self.captureToSendMS = None
+
+    def _smooth(self, lastValue: float | None, value: float) -> float:
+        if lastValue is None:
+            return value
+        return lastValue + self._smoothing * (value - lastValue)
+
+    def onPingSent(self, sequence: int, timestampMS: int):
+        self._pings[sequence] = [timestampMS, False]
+
+        while len(self._pings) > self._windowSize:
+            self._pings.popitem(last=False)
+
+    def onPong(self, sequence: int, timestampMS: int, nowMS: int):
+        ping = self._pings.get(sequence, None)
+
+        # 太旧或者重复的 PONG
+        if ping is None or ping[1] or ping[0] != timestampMS:
+            return
+
+        ping[1] = True
+        self.rttMS = self._smooth(self.rttMS, nowMS - timestampMS)
+
+    def onSend(self, captureToSendMS: int):
+        self.captureToSendMS = self._smooth(self.captureToSendMS, captureToSendMS)
+
+    def lossRate(self, nowMS: int, timeoutMS: int) -> float | None:
+        # 只统计已经收到 PONG 或者已经超时的 PING
+        resolvedCount = 0
+        answeredCount = 0
+
+        for sentMS, answered in self._pings.values():
+            if answered:
+                resolvedCount += 1
+                answeredCount += 1
+            elif nowMS - sentMS >= timeoutMS:
+                resolvedCount += 1
+
+        if resolvedCount == 0:
+            return None
+        return 1 - answeredCount / resolvedCount
+
+class RateLimiter(object):
+    # 每个 key 每秒最多放行 maxRate 次。时间戳用帧的采集时间，这样抖动的发送时间不会让帧被多丢或者少丢
+    def __init__(self, maxRate: float):
+        self._intervalMS = 1000.0 / maxRate
+
+        # key -> 下一次可以放行的时间
+        self._deadlines = {}
+        self._lastPruneMS = 0
+
+    def admit(self, key, nowMS: int) -> bool:
+        # 对象的 ID 不会复用，消失的对象留下的 key 要定期清理
+        if nowMS - self._lastPruneMS >= max(1000.0, self._intervalMS * 4):
+            self._lastPruneMS = nowMS
+            self._prune(nowMS)
+
+        deadline = self._deadlines.get(key, None)
+
+        if deadline is not None and nowMS < deadline:
+            return False
+
+        # 从上一次的期限往后推，平均下来正好是 maxRate。停了很久以后不会一下子放行一串
+        if deadline is None or nowMS - deadline >= self._intervalMS:
+            deadline = nowMS
+        self._deadlines[key] = deadline + self._intervalMS
+        return True
+
+    def _prune(self, nowMS: int):
+        # 超过一个间隔没有再用到的 key，下一次 admit 时也会从 nowMS 重新开始，删掉不影响结果
+        staleKeys = [k for k, deadline in self._deadlines.items() if nowMS - deadline >= self._intervalMS]
+
+        for key in staleKeys:
+            del self._deadlines[key]
@@ -0,0 +1,195 @@
+import socket
+import threading
+import time
+import typing
+
+import channelStream
+
+from metrics import metrics
+from packet import Packet, PACKET_EXT_OVERHEAD_SIZE, PACKET_MAX_PAYLOAD_SIZE
+from server import UDPServer, OPT_IN_PACKET_CODES
+from protos.keyframeRequest_pb2 import KeyframeRequest
+from protos.packetCode_pb2 import PacketCode
+
+# 这些包只和上游之间有关，不转发
+_CONTROL_PACKET_CODES = frozenset([
+    PacketCode.QUIT_NOTIFY,
+    PacketCode.HEART_BEAT_RSP,
+    PacketCode.FACE_SCHEMA_RSP,
+    PacketCode.PONG,
+    PacketCode.MULTICAST_RSP,
+])
+
+class UpstreamLink(object):
+    # 作为一个普通的客户端连接上游服务器（采集服务器或者另一个中继），
+    # 把收到的 forwardCodes 里的数据包原样广播给 server 的客户端
+    # request 是每次连上上游以后发送的请求，例如 FACE_SCHEMA_REQ
+    def __init__(self, server: UDPServer, upstreamAddr, forwardCodes: typing.Iterable[PacketCode], request: Packet | None = None, *,
+                 heartBeatIntervalSecs=2.0, timeoutSecs=5.0, recvPollTimeoutSecs=0.1):
+        self._server = server
+        self._upstreamAddr = upstreamAddr
+        self._forwardCodes = frozenset(forwardCodes)
+        self._request = request
+
+        self._heartBeatIntervalSecs = heartBeatIntervalSecs
+        self._timeoutSecs = timeoutSecs
+        self._lastHeartBeatTime = 0.0
+        self._lastRecvTime = 0.0
+        self._connected = False
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.connect(upstreamAddr)
+        self._sock.settimeout(recvPollTimeoutSecs)
+
+        self._forwardStats = metrics.stage('relay.forward')
+
+        self._recvThreadStopEvent = threading.Event()
+        self._recvThread = threading.Thread(target=self._recv, name='Upstream', daemon=True)
+
+    @property
+    def isConnected(self) -> bool:
+        return self._connected
+
+    @property
+    def request(self) -> Packet | None:
+        return self._request
+
+    def start(self):
+        self._recvThread.start()
+        self.tick()
+
+    def close(self):
+        self._recvThreadStopEvent.set()
+        self._recvThread.join()
+
+        self._send(Packet(PacketCode.QUIT_NOTIFY))
+        self._sock.close()
+
+    def send(self, packet: Packet):
+        # 只有连上以后才发送，断开时发的请求在重新连上后会重新发送
+        if self._connected:
+            self._send(packet)
+
+    def _send(self, packet: Packet):
+        try:
+            self._sock.send(packet.encode())
+        except OSError:
+            # 上游还没启动时 Windows 上会收到 ConnectionResetError
+            pass
+
+    def tick(self):
+        now = time.monotonic()
+
+        if self._connected and now - self._lastRecvTime >= self._timeoutSecs:
+            self._connected = False
+            print(f'Upstream {self._upstreamAddr} lost connection!')
+
+        # 上游也靠心跳判断客户端是否还在。没连上时也一直发，上游启动后就能连上
+        if now - self._lastHeartBeatTime >= self._heartBeatIntervalSecs:
+            self._lastHeartBeatTime = now
+            self._send(Packet(PacketCode.HEART_BEAT_REQ))
+
+    def _recv(self):
+        while not self._recvThreadStopEvent.is_set():
+            try:
+                data = self._sock.recv(PACKET_EXT_OVERHEAD_SIZE + PACKET_MAX_PAYLOAD_SIZE)
+            except (socket.timeout, OSError):
+                continue
+
+            packet = Packet.decode(data)
+
+            if packet is None:
+                print(f'A bad packet was received from upstream {self._upstreamAddr}!')
+                continue
+
+            self._lastRecvTime = time.monotonic()
+            self._handlePacket(packet)
+
+    def _handlePacket(self, packet: Packet):
+        match packet.packetCode:
+            case PacketCode.HEART_BEAT_RSP:
+                if not self._connected:
+                    self._connected = True
+                    print(f'Connected to upstream {self._upstreamAddr}.')
+
+                    if self._request is not None:
+                        self._send(self._request)
+
+            case PacketCode.QUIT_NOTIFY:
+                # 上游关闭了，继续发心跳等它重新启动
+                self._connected = False
+                print(f'Upstream {self._upstreamAddr} quit.')
+
+            case code if code in self._forwardCodes:
+                # 上游的时间戳来自另一台机器的时钟，不再转发
+                startNS = time.perf_counter_ns()
+                self._server.send(Packet(code, packet.payloadBytes))
+                self._forwardStats.since(startNS)
+
+class Relay(object):
+    # 中继服务器：从上游接收数据，再广播给自己的客户端。协议和采集服务器完全相同，所以中继可以串联
+    # 客户端需要紧凑格式或者增量数据流时，才向上游多建立一个对应的连接
+    def __init__(self, server: UDPServer, upstreamAddr, **linkOptions):
+        self._server = server
+        self._upstreamAddr = upstreamAddr
+        self._linkOptions = linkOptions
+
+        # 默认广播的数据包，例如 FACE_DATA、POSE_DATA 和 FRAME_DATA
+        defaultCodes = [c for c in PacketCode.values() if c not in OPT_IN_PACKET_CODES and c not in _CONTROL_PACKET_CODES]
+        self._defaultLink = UpstreamLink(server, upstreamAddr, defaultCodes, **linkOptions)
+
+        keyframeRequest = KeyframeRequest()
+        keyframeRequest.stream = PacketCode.FACE_DATA
+
+        # 需要订阅的数据包 -> (转发的数据包, 请求)
+        self._optInLinkSpecs = {
+            PacketCode.COMPACT_FACE_DATA: ((PacketCode.COMPACT_FACE_DATA,), Packet(PacketCode.FACE_SCHEMA_REQ)),
+            PacketCode.DELTA_DATA: ((PacketCode.KEYFRAME_DATA, PacketCode.DELTA_DATA),
+                                    Packet(PacketCode.KEYFRAME_REQ, keyframeRequest.SerializeToString())),
+        }
+        self._optInLinks = {}
+
+        # 客户端的 KEYFRAME_REQ 转发给上游
+        channelStream.addKeyframeSource(PacketCode.FACE_DATA, self)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    def start(self):
+        self._defaultLink.start()
+        print(f'Relay from upstream {self._upstreamAddr}...')
+
+    def close(self):
+        self._defaultLink.close()
+
+        for link in self._optInLinks.values():
+            link.close()
+        self._optInLinks.clear()
+
+    def tick(self):
+        self._defaultLink.tick()
+
+        for packetCode, (forwardCodes, request) in self._optInLinkSpecs.items():
+            link = self._optInLinks.get(packetCode, None)
+            hasSubscribers = self._server.hasSubscribers(packetCode)
+
+            if link is None and hasSubscribers:
+                link = UpstreamLink(self._server, self._upstreamAddr, forwardCodes, request, **self._linkOptions)
+                self._optInLinks[packetCode] = link
+                link.start()
+            elif link is not None and not hasSubscribers:
+                del self._optInLinks[packetCode]
+                link.close()
+            elif link is not None:
+                link.tick()
+
+    def requestKeyframe(self):
+        #! 在接收线程调用
+        link = self._optInLinks.get(PacketCode.DELTA_DATA, None)
+
+        if link is not None:
+            link.send(link.request)